@@ -1,5 +1,14 @@
-from herder.utils.input import input_box
-from herder.utils.llm import stream_llm_with_tools, fn_adapter_mcp2ollama, list_models, list_running_models, pull_model
+from herder.utils.input import InputSession
+from herder.utils.llm import stream_llm_with_tools, fn_adapter_mcp2ollama, list_models, list_running_models
+from herder.utils.sandbox import make_file_tools
+from herder.utils.commands import make_command_tools, DEFAULT_TIMEOUT, DEFAULT_MAX_OUTPUT, COMMAND_TIMEOUT_GRACE
+from herder.utils.deadlines import ToolPolicy
+from herder.utils.profiles import load_profiles, resolve_profile
+from herder.utils.cassette import CassetteRecorder, CassettePlayer, replay_turn
+from herder.utils.pulls import PullManager, DEFAULT_PULL_CONCURRENCY
+from herder.utils.messages import MessageStore
+from herder.utils.scheduler import ModelAffinityScheduler, DEFAULT_MAX_CONSECUTIVE, DEFAULT_MAX_WAIT
+from herder.utils.race import Race, RaceStats, parse_racers, DEFAULT_RACE_STATS_PATH
 import datetime
 import json
 from pyfiglet import figlet_format
@@ -23,15 +32,39 @@ DEFAULT_SYSTEM_PROMPT = "No system prompt was given. Follow all user instruction
 def main():
     parser = argparse.ArgumentParser(description=COMMAND_NAME)
     parser.add_argument('--prompt', type=str, default=None, help='Single-shot prompt (skip chat loop)')
+    parser.add_argument('--batch', type=str, default=None, help='JSONL file of prompts to run, one {"prompt", "model", "history_file", "system_prompt"} object per line (skip chat loop)')
+    parser.add_argument('--batch-max-consecutive', type=int, default=DEFAULT_MAX_CONSECUTIVE, help=f'Batch mode: most requests run back to back on one model while other models wait (default: {DEFAULT_MAX_CONSECUTIVE})')
+    parser.add_argument('--batch-max-wait', type=float, default=DEFAULT_MAX_WAIT, help=f'Batch mode: seconds a model\'s queue may wait before it is served next (default: {DEFAULT_MAX_WAIT:.0f})')
     parser.add_argument('--history-file', type=str, default=None, help='Path to message history file')
     parser.add_argument('--no-banner', action='store_true', help='Suppress banner output')
     parser.add_argument('--mcp-config', type=str, default=None, help='Path to MCP config file (JSON)')
     parser.add_argument('--model', type=str, default="mistral-small3.2:24b", help='Model name for Ollama')
+    parser.add_argument('--race', type=str, default=None, metavar='MODELS', help='Comma-separated models (optionally model@host) to race; the first to produce a token answers, the rest are cancelled')
+    parser.add_argument('--race-hedge-ms', type=int, default=0, help='Start raced models one at a time, best first, each only if no token has arrived after this many milliseconds (default: 0, all at once)')
+    parser.add_argument('--race-stats', type=str, default=DEFAULT_RACE_STATS_PATH, help=f'File keeping race wins and latencies, used to order racers (default: {DEFAULT_RACE_STATS_PATH})')
+    parser.add_argument('--model-profile', type=str, default=None, help='Runtime profile from "model_profiles" in the MCP config, or "auto" to size num_ctx per request (default: the profile named after the model, if any)')
     parser.add_argument('--system-prompt', type=str, default="herder-instructions.md", help='Path to system prompt file (default: herder-instructions.md)')
     parser.add_argument('--system-prompt-message', type=str, default=None, help='System prompt as a string (takes precedence over --system-prompt)')
     parser.add_argument('--debug-mcp-servers', action='store_true', help='Enable MCP server debug output (do not suppress stderr)')
     parser.add_argument('--debug-herder', action='store_true', help='Enable herder debug output')
+    parser.add_argument('--ensure-models', type=str, default=None, help='Comma-separated models to pull (in parallel) before starting, if not installed')
+    parser.add_argument('--pull-concurrency', type=int, default=DEFAULT_PULL_CONCURRENCY, help=f'Maximum concurrent model pulls (default: {DEFAULT_PULL_CONCURRENCY})')
+    parser.add_argument('--record', type=str, default=None, metavar='CASSETTE', help='Record all model requests/streams and tool calls to a JSONL cassette')
+    parser.add_argument('--replay', type=str, default=None, metavar='CASSETTE', help='Replay a recorded cassette offline instead of calling Ollama and MCP servers')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Scale recorded latencies during --replay (0 = as fast as possible, 1 = as recorded)')
+    parser.add_argument('--sandbox-root', type=str, default=None, help='Enable the built-in file tools, restricted to this directory')
+    parser.add_argument('--enable-commands', action='store_true', help='Enable the built-in command tool (runs in --sandbox-root if set)')
+    parser.add_argument('--command-timeout', type=int, default=DEFAULT_TIMEOUT, help=f'Wall-clock limit in seconds for the command tool (default: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--command-max-output', type=int, default=DEFAULT_MAX_OUTPUT, help=f'Output bytes kept from each command (default: {DEFAULT_MAX_OUTPUT})')
     args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error('--record and --replay cannot be used together')
+    if args.race and (args.record or args.replay):
+        parser.error('--race cannot be used with --record or --replay')
+    if args.race and args.batch:
+        parser.error('--race cannot be used with --batch')
+    if args.race and len(parse_racers(args.race)) < 2:
+        parser.error('--race needs at least two models')
 
     global ENABLE_DEBUG
     ENABLE_DEBUG = args.debug_herder
@@ -42,13 +75,13 @@ def main():
 
     devnull = open(os.devnull, 'w')
     model = args.model
-    messages = []
+    messages = MessageStore()
     if args.history_file:
         try:
             with open(args.history_file, 'r') as f:
-                messages = json.load(f)
+                messages = MessageStore(json.load(f))
         except Exception:
-            messages = []
+            messages = MessageStore()
 
     tools=[]
     # System prompt file logic
@@ -72,6 +105,17 @@ def main():
         print()
         print()
 
+    if args.ensure_models and not args.replay:
+        ensure = [m.strip() for m in args.ensure_models.split(',') if m.strip()]
+        try:
+            installed = [m.model for m in list_models().models]
+        except Exception as e:
+            print(f"Error listing Ollama models: {e}")
+            sys.exit(1)
+        if not PullManager(args.pull_concurrency).ensure(ensure, installed):
+            print("Error: Not all required models could be pulled.")
+            sys.exit(1)
+
     # Connect to MCP server and get tools - suppress server logs
     # Use subprocess-level redirection to suppress MCP server output
     import subprocess
@@ -87,6 +131,8 @@ def main():
 
     # Only load MCP servers from config if provided
     mcp_servers = []
+    mcp_server_names = []
+    mcp_config = {}
     if args.mcp_config:
         try:
             with open(args.mcp_config, 'r') as f:
@@ -96,34 +142,96 @@ def main():
                     command=server['command'],
                     args=server.get('args', [])
                 ))
+                mcp_server_names.append(server.get('name', server['command']))
         except Exception as e:
             print(f"Error loading MCP config: {e}")
             # mcp_servers remains empty
+            mcp_servers = []
+            mcp_server_names = []
+            mcp_config = {}
+    cassette = None
+    if args.replay:
+        try:
+            cassette = CassettePlayer(args.replay, speed=args.replay_speed)
+        except Exception as e:
+            print(f"Error loading cassette: {e}")
+            sys.exit(1)
+        # Replays are offline: recorded tools stand in for the MCP servers.
+        mcp_servers = []
+    elif args.record:
+        cassette = CassetteRecorder(args.record)
+
+    tool_policy = ToolPolicy.from_config(mcp_config)
+    profiles = load_profiles(mcp_config)
+    if args.model_profile and args.model_profile not in profiles:
+        print(f"Error: Model profile '{args.model_profile}' not found. Available profiles: {', '.join(profiles)}")
+        sys.exit(1)
     try:
         if mcp_servers:
-            with MCPAdapt(mcp_servers, SmolAgentsAdapter()) as mcptools:
-                run_main_logic(args, model, messages, system_prompt, mcptools)
+            # Let the tool policy enforce deadlines instead of the MCP session's short default read timeout.
+            adapter = MCPAdapt(mcp_servers, SmolAgentsAdapter(), client_session_timeout_seconds=tool_policy.max_timeout())
+            with adapter as mcptools:
+                tool_policy.map_servers(mcp_server_names, adapter.mcp_tools, mcptools)
+                if cassette:
+                    mcptools = cassette.mcp_tools(mcptools)
+                run_main_logic(args, model, messages, system_prompt, mcptools, tool_policy, profiles, cassette)
         else:
-            mcptools = []
-            run_main_logic(args, model, messages, system_prompt, mcptools)
+            mcptools = cassette.mcp_tools([]) if cassette else []
+            run_main_logic(args, model, messages, system_prompt, mcptools, tool_policy, profiles, cassette)
     finally:
         subprocess.Popen = original_popen
         devnull.close()
+        if cassette:
+            summary = cassette.summary()
+            if summary:
+                print(f"\033[90m  [{summary}]\033[0m")
+            cassette.close()
 
-def run_main_logic(args, model, messages, system_prompt, mcptools):
+def run_main_logic(args, model, messages, system_prompt, mcptools, tool_policy=None, profiles=None, cassette=None):
     """
     Handles single-shot prompt mode and delegates to chat loop if no prompt is provided.
 
     Args:
         args: Parsed command-line arguments (argparse.Namespace).
         model: Model name for Ollama.
-        messages: List of chat messages (history).
+        messages: Chat history (MessageStore).
         system_prompt: System prompt string for the LLM.
         mcptools: List of MCP tool callables.
+        tool_policy: Deadlines and circuit breakers for tool calls.
+        profiles: Model runtime profiles by name.
+        cassette: CassetteRecorder or CassettePlayer for --record/--replay, if any.
 
-    - If --prompt is set, runs a one-off LLM interaction and prints the result.
+    - Builds the native tools (sandboxed file access, command calling) when enabled.
+    - If --batch is set, runs every prompt in the file, grouped by model.
+    - If --prompt is set, runs a one-off LLM interaction and prints the result (raced if --race is set).
     - Otherwise, enters interactive chat mode.
     """
+    nativetools = []
+    if args.sandbox_root:
+        try:
+            nativetools.extend(make_file_tools(args.sandbox_root))
+        except Exception as e:
+            print(f"Error setting up sandbox: {e}")
+            sys.exit(1)
+    if args.enable_commands:
+        nativetools.extend(make_command_tools(cwd=args.sandbox_root, timeout=args.command_timeout, max_output=args.command_max_output))
+        if tool_policy is not None:
+            # Let --command-timeout govern run_command rather than the generic tool deadline.
+            tool_policy.default_tool_timeout("run_command", args.command_timeout + COMMAND_TIMEOUT_GRACE)
+    client = None
+    if cassette:
+        nativetools = cassette.native_tools(nativetools)
+        client = cassette.client()
+    racers = parse_racers(args.race) if args.race else []
+    race_stats = RaceStats(args.race_stats)
+    race_hedge = args.race_hedge_ms / 1000
+
+    if args.batch is not None:
+        ok = run_batch(args, model, system_prompt, mcptools, nativetools, tool_policy, profiles or {}, client)
+        if not ok:
+            sys.exit(1)
+        return
+
     if args.prompt is not None:
         user_input = f"""
         Additional Info From User Client:
@@ -134,298 +242,491 @@ def run_main_logic(args, model, messages, system_prompt, mcptools):
         print(f"\033[90m  User ({get_timestamp()}):\033[0m")
         print(args.prompt)
         print()
-        print(f"\033[90m  {model} ({get_timestamp()}):\033[0m")
-        tools_ollama = fn_adapter_mcp2ollama(mcptools)
-        messages = stream_llm_with_tools(model=model, user_input=user_input, tools=tools_ollama, system_prompt=system_prompt, messages=messages, mcptools=mcptools)
+        race = Race(racers, race_stats, race_hedge) if racers else None
+        print(f"\033[90m  {race_label(racers) if race else model} ({get_timestamp()}):\033[0m")
+        tools_ollama = fn_adapter_mcp2ollama(mcptools, nativetools)
+        with replay_turn(client):
+            messages = stream_llm_with_tools(model=model, user_input=user_input, tools=tools_ollama, system_prompt=system_prompt, messages=messages, mcptools=mcptools, tool_policy=tool_policy, profile=resolve_profile(profiles or {}, model, args.model_profile), client=client, race=race)
         if args.history_file:
             with open(args.history_file, 'w') as f:
-                json.dump(messages, f, indent=2, ensure_ascii=False)
+                json.dump(messages.to_list(), f, indent=2, ensure_ascii=False)
         print()
         return
 
-    messages = chat(model=model, messages=messages, system_prompt=system_prompt, mcptools=mcptools)
+    messages = chat(model=model, messages=messages, system_prompt=system_prompt, mcptools=mcptools, nativetools=nativetools, tool_policy=tool_policy, profiles=profiles, profile_name=args.model_profile, client=client, pull_manager=PullManager(args.pull_concurrency), racers=racers, race_stats=race_stats, race_hedge=race_hedge)
     if args.history_file:
         with open(args.history_file, 'w') as f:
-            json.dump(messages, f, indent=2, ensure_ascii=False)
+            json.dump(messages.to_list(), f, indent=2, ensure_ascii=False)
+
+def run_batch(args, model, system_prompt, mcptools, nativetools, tool_policy, profiles, client=None) -> bool:
+    """
+    Runs every prompt of a --batch file through a ModelAffinityScheduler.
+
+    Args:
+        args: Parsed command-line arguments (argparse.Namespace).
+        model: Default model for jobs that don't name one.
+        system_prompt: Default system prompt for jobs that don't set one.
+        mcptools: List of MCP tool callables.
+        nativetools: List of native tool callables.
+        tool_policy: Deadlines and circuit breakers for tool calls.
+        profiles: Model runtime profiles by name.
+        client: Ollama client override (cassette recording/replay).
+
+    Returns:
+        bool: True if every job completed.
+
+    Jobs for the same model run back to back, and models Ollama already has loaded go first,
+    so a mixed batch pays for as few model loads as possible. Jobs that share a history file
+    continue one conversation, so they run in file order as a single chained request.
+    """
+    try:
+        with open(args.batch, 'r') as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+    except Exception as e:
+        print(f"Error loading batch file: {e}")
+        return False
+
+    tools_ollama = fn_adapter_mcp2ollama(mcptools, nativetools)
+
+    def run_job(index, job):
+        job_model = job.get("model", model)
+        history_file = job.get("history_file")
+        messages = MessageStore()
+        if history_file and os.path.exists(history_file):
+            with open(history_file, 'r') as f:
+                messages = MessageStore(json.load(f))
+        user_input = f"""
+        Additional Info From User Client:
+        Current timestamp: {get_timestamp()}
+        --- Begin User Message ---
+        {job["prompt"]}
+        """
+        print(f"\033[90m  [job {index + 1}/{len(jobs)}] User ({get_timestamp()}):\033[0m")
+        print(job["prompt"])
+        print()
+        print(f"\033[90m  {job_model} ({get_timestamp()}):\033[0m")
+        with replay_turn(client):
+            messages = stream_llm_with_tools(model=job_model, user_input=user_input, tools=tools_ollama, system_prompt=job.get("system_prompt", system_prompt), messages=messages, mcptools=mcptools, tool_policy=tool_policy, profile=resolve_profile(profiles, job_model, job.get("model_profile", args.model_profile)), client=client)
+        print()
+        print()
+        if history_file:
+            with open(history_file, 'w') as f:
+                json.dump(messages.to_list(), f, indent=2, ensure_ascii=False)
+
+    def resident_models():
+        return [m.model for m in list_running_models().models]
+
+    started = datetime.datetime.now()
+    scheduler = ModelAffinityScheduler(
+        resident_models=None if args.replay else resident_models,
+        max_consecutive=args.batch_max_consecutive,
+        max_wait=args.batch_max_wait,
+    )
+    def run_chain(chain):
+        errors = []
+        for index, job in chain:
+            try:
+                run_job(index, job)
+            except Exception as e:
+                errors.append((index, e))
+        return errors
+
+    # Group jobs into chains: one per shared history file, in file order, scheduled under the model of
+    # the chain's first job. Reordering them by model would read and write the history out of order.
+    chains = []
+    chain_by_history = {}
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict) or "prompt" not in job:
+            print(f"Error: batch job {index + 1} has no prompt; skipping.")
+            continue
+        history_file = job.get("history_file")
+        if history_file:
+            key = os.path.abspath(history_file)
+            if key not in chain_by_history:
+                chain_by_history[key] = []
+                chains.append(chain_by_history[key])
+            chain_by_history[key].append((index, job))
+        else:
+            chains.append([(index, job)])
+    futures = [(chain, scheduler.submit(chain[0][1].get("model", model), run_chain, chain)) for chain in chains]
+    scheduler.shutdown(wait=True)
+
+    submitted = sum(len(chain) for chain in chains)
+    failed = 0
+    for chain, future in futures:
+        error = future.exception()
+        errors = [(index, error) for index, _ in chain] if error is not None else future.result()
+        for index, job_error in errors:
+            failed += 1
+            print(f"  \033[91m[job {index + 1}] error: {job_error}\033[0m")
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    print(f"\033[90m  [batch: {submitted - failed}/{len(jobs)} jobs completed in {elapsed:.1f}s, {scheduler.switches} model switches]\033[0m")
+    return failed == 0 and submitted == len(jobs)
 
 def chat(
     model: str = "mistral-small3.2:24b",
-    messages: list = None,
+    messages: MessageStore = None,
     mcptools: list = None,
-    system_prompt: str = "You are a helpful AI assistant named Bob, an expert in cryptography."
-) -> list:
+    nativetools: list = None,
+    system_prompt: str = "You are a helpful AI assistant named Bob, an expert in cryptography.",
+    tool_policy: ToolPolicy = None,
+    profiles: dict = None,
+    profile_name: str = None,
+    client=None,
+    pull_manager: PullManager = None,
+    racers: list = None,
+    race_stats: RaceStats = None,
+    race_hedge: float = 0.0
+) -> MessageStore:
     """
     Interactive chat loop for multi-turn conversations with the LLM.
 
     Args:
         model (str): Model name for Ollama.
-        messages (list): List of chat messages (history).
+        messages (MessageStore): Chat history.
         mcptools (list): List of MCP tool callables.
+        nativetools (list): List of native tool callables (sandboxed file access, etc).
         system_prompt (str): System prompt string for the LLM.
+        tool_policy (ToolPolicy): Deadlines and circuit breakers for tool calls.
+        profiles (dict): Model runtime profiles by name.
+        profile_name (str): Selected profile; None uses the profile named after the model, if any.
+        client: Ollama client override (cassette recording/replay); defaults to ollama.Client().
+        pull_manager (PullManager): Runs /ollama pull downloads in the background.
+        racers (list): Racers (see herder.utils.race) to race each turn across; empty uses `model` alone.
+        race_stats (RaceStats): Race wins and latencies, shared by every race in the session.
+        race_hedge (float): Seconds before each next-ranked racer joins a race (0 starts all at once).
 
     Returns:
-        list: Updated messages list.
+        MessageStore: Updated chat history.
 
-    - Handles user commands and chat messages.
+    - Handles user commands and chat messages, including ones queued while a response is streaming.
     - Prints model responses and updates message history.
     """
     if messages is None:
-        messages = []
-
-    while True:
-        user_input = input_box()
-
-        if user_input is None:
-            break
-
-        # /help should be first
-        if user_input.lower().startswith("/help") or  user_input.startswith("/?"):
-            print("\nAvailable commands:")
-            print("  /help         Show this help message")
-            print("  /model show   Show the current model")
-            print("  /model set <model-name>   Set the model")
-            print("  /history      Show chat history")
-            print("  /tools        Show tool debug info")
-            print("  /mcptools     Show raw MCP tools debug info")
-            print("  /system set   Set the system prompt")
-            print("  /system show  Show the current system prompt")
-            print("  /ollama list  List available Ollama models")
-            print("  /ollama ps    List running Ollama processes")
-            print("  /ollama pull <model>   Pull a model from Ollama")
-            print("  /exit         Exit the chat loop")
-            print()
-            continue
-
-        # /model commands
-        if user_input.lower().startswith("/model"):
-            args = user_input.split(' ')
-            if len(args) > 2 and args[1].lower() == "set":
-                model = ' '.join(args[2:])
-                print(f"  Model set to: {model}")
-            elif len(args) > 1 and args[1].lower() == "show":
-                print(f"Current model: {model}")
-            else:
-                print("  Options:")
-                print("        /model set <model-name>")
-                print("        /model show")
-            print()
-            continue
+        messages = MessageStore()
+    if mcptools is None:
+        mcptools = []
+    if nativetools is None:
+        nativetools = []
+    if tool_policy is None:
+        tool_policy = ToolPolicy()
+    if profiles is None:
+        profiles = load_profiles(None)
+    if pull_manager is None:
+        pull_manager = PullManager()
+    if racers is None:
+        racers = []
+    if race_stats is None:
+        race_stats = RaceStats()
+
+    # The input box stays live across turns, so messages typed while the model responds are queued.
+    session = InputSession()
+    session.start()
+    try:
+        while True:
+            user_input = session.get()
+
+            if user_input is None:
+                break
+
+            # /help should be first
+            if user_input.lower().startswith("/help") or  user_input.startswith("/?"):
+                print("\nAvailable commands:")
+                print("  /help         Show this help message")
+                print("  /model show   Show the current model")
+                print("  /model set <model-name> [--profile <name>]   Set the model (and runtime profile)")
+                print("  /model race <model>,<model>[@host],...   Race models each turn; /model race off to stop")
+                print("  /history      Show chat history")
+                print("  /tools        Show tool debug info")
+                print("  /mcptools     Show raw MCP tools debug info")
+                print("  /system set   Set the system prompt")
+                print("  /system show  Show the current system prompt")
+                print("  /ollama list  List available Ollama models")
+                print("  /ollama ps    List running Ollama processes")
+                print("  /ollama pull [--wait] <model> [<model> ...]   Pull models from Ollama in the background")
+                print("  /ollama pulls          Show pull progress")
+                print("  /exit         Exit the chat loop")
+                print()
+                continue
 
-        if user_input.lower().startswith("/history"):
-            print(json.dumps(messages, indent=2, ensure_ascii=False))
-            continue
+            # /model commands
+            if user_input.lower().startswith("/model"):
+                args = user_input.split()
+                if len(args) > 2 and args[1].lower() == "set":
+                    set_args = args[2:]
+                    new_profile_name = profile_name
+                    if "--profile" in set_args:
+                        i = set_args.index("--profile")
+                        new_profile_name = ' '.join(set_args[i + 1:]) or None
+                        set_args = set_args[:i]
+                        if new_profile_name and new_profile_name not in profiles:
+                            print(f"  Profile '{new_profile_name}' not found. Available profiles: {', '.join(profiles)}")
+                            print()
+                            continue
+                        profile_name = new_profile_name
+                    if set_args:
+                        model = ' '.join(set_args)
+                        print(f"  Model set to: {model}")
+                    profile = resolve_profile(profiles, model, profile_name)
+                    print(f"  Profile: {profile.describe() if profile else 'none (Ollama defaults)'}")
+                elif len(args) > 1 and args[1].lower() == "race":
+                    race_spec = ''.join(args[2:])
+                    if race_spec.lower() == "off":
+                        racers = []
+                        print(f"  Racing off. Model: {model}")
+                    elif race_spec:
+                        new_racers = parse_racers(race_spec)
+                        if client is not None:
+                            # Racers open their own connections, which would bypass the cassette.
+                            print("  Racing is not available with --record or --replay.")
+                        elif len(new_racers) < 2:
+                            print("  Racing needs at least two models.")
+                        else:
+                            racers = new_racers
+                            print(f"  Racing: {race_label(racers)}")
+                    elif racers:
+                        print(f"  Racing: {race_label(racers)}")
+                        print(race_stats.describe(racers))
+                    else:
+                        print("  Racing off.")
+                elif len(args) > 1 and args[1].lower() == "show":
+                    profile = resolve_profile(profiles, model, profile_name)
+                    print(f"Current model: {model}")
+                    print(f"Current profile: {profile.describe() if profile else 'none (Ollama defaults)'}")
+                    print(f"Available profiles: {', '.join(profiles)}")
+                    if racers:
+                        print(f"Racing: {race_label(racers)}")
+                        print(race_stats.describe(racers))
+                else:
+                    print("  Options:")
+                    print("        /model set <model-name> [--profile <name>]")
+                    print("        /model set --profile <name>")
+                    print("        /model race <model>,<model>[@host],...")
+                    print("        /model race off")
+                    print("        /model show")
+                print()
+                continue
 
-        if user_input.lower().startswith("/tools"):
-            print()
-            print("Tool Debug Info:")
+            if user_input.lower().startswith("/history"):
+                print(json.dumps(messages.to_list(), indent=2, ensure_ascii=False))
+                continue
 
-            for tool in mcptools:
+            if user_input.lower().startswith("/tools"):
                 print()
-                if ENABLE_DEBUG:
-                    tool_type = type(tool)
-                    relevant_attrs = ['name', 'description', 'inputs', 'output_type']
-                    other_attrs = [a for a in dir(tool) if not a.startswith('__') and a not in relevant_attrs]
-                    print(f"\033[90m  DEBUG: Tool Info\033[0m")
-                    print(f"\033[90m    Type: {tool_type} (module: {tool_type.__module__})\033[0m")
-                    print(f"\033[90m    Bases: {[base.__name__ for base in tool_type.__bases__]}\033[0m")
-                    doc = getattr(tool_type, '__doc__', None)
-                    if doc:
-                        print(f"\033[90m    Type docstring: {doc.strip()}\033[0m")
-                    for attr in relevant_attrs:
-                        print(f"\033[90m    {attr}: {getattr(tool, attr, 'N/A')}\033[0m")
-                    print(f"\033[90m    Other attributes: {', '.join(other_attrs)}\033[0m")
+                print("Tool Debug Info:")
+
+                for tool in mcptools:
                     print()
-                print("name:        ", getattr(tool, "name", getattr(tool, "__name__", str(tool))))
-                print("description: ", getattr(tool, "description", getattr(tool, "__doc__", "No description available.")))
-            print("")
-            continue
+                    if ENABLE_DEBUG:
+                        tool_type = type(tool)
+                        relevant_attrs = ['name', 'description', 'inputs', 'output_type']
+                        other_attrs = [a for a in dir(tool) if not a.startswith('__') and a not in relevant_attrs]
+                        print(f"\033[90m  DEBUG: Tool Info\033[0m")
+                        print(f"\033[90m    Type: {tool_type} (module: {tool_type.__module__})\033[0m")
+                        print(f"\033[90m    Bases: {[base.__name__ for base in tool_type.__bases__]}\033[0m")
+                        doc = getattr(tool_type, '__doc__', None)
+                        if doc:
+                            print(f"\033[90m    Type docstring: {doc.strip()}\033[0m")
+                        for attr in relevant_attrs:
+                            print(f"\033[90m    {attr}: {getattr(tool, attr, 'N/A')}\033[0m")
+                        print(f"\033[90m    Other attributes: {', '.join(other_attrs)}\033[0m")
+                        print()
+                    print("name:        ", getattr(tool, "name", getattr(tool, "__name__", str(tool))))
+                    print("description: ", getattr(tool, "description", getattr(tool, "__doc__", "No description available.")))
+                for tool in nativetools:
+                    print()
+                    print("name:        ", tool.__name__)
+                    print("description: ", (tool.__doc__ or "No description available.").strip().splitlines()[0])
+                print("")
+                continue
 
-        if user_input.lower().startswith("/mcptools"):
-            print()
-            print("Raw MCP Tools Debug Info:")
-            for tool in mcptools:
+            if user_input.lower().startswith("/mcptools"):
                 print()
-                print("name:        ", getattr(tool, "name", getattr(tool, "__name__", str(tool))))
-                print("description: ", getattr(tool, "description", getattr(tool, "__doc__", "No description available.")))
-                print("inputs:      ", getattr(tool, "inputs", "N/A"))
-                print("output_type: ", getattr(tool, "output_type", "N/A"))
-            continue
-
-        if user_input.lower().startswith("/system"):
-            args = user_input.split(' ')
-            if len(args) > 2 and args[1].lower() == "set":
-                system_prompt = ' '.join(args[2:])
-                print(f"  System prompt set to:")
-                print(f"{system_prompt}")
+                print("Raw MCP Tools Debug Info:")
+                for tool in mcptools:
+                    print()
+                    print("name:        ", getattr(tool, "name", getattr(tool, "__name__", str(tool))))
+                    print("description: ", getattr(tool, "description", getattr(tool, "__doc__", "No description available.")))
+                    print("inputs:      ", getattr(tool, "inputs", "N/A"))
+                    print("output_type: ", getattr(tool, "output_type", "N/A"))
+                continue
 
-            elif len(args) > 1 and args[1].lower() == "show":
-                try:
-                    print(f"Current system prompt:")
+            if user_input.lower().startswith("/system"):
+                args = user_input.split(' ')
+                if len(args) > 2 and args[1].lower() == "set":
+                    system_prompt = ' '.join(args[2:])
+                    print(f"  System prompt set to:")
                     print(f"{system_prompt}")
-                except NameError:
-                    print("System prompt is not set.")
-            else:
-                print("  Options:")
-                print("        /system set")
-                print("        /system show")
-
-            print()
-            continue
 
-        # /ollama commands
-        if user_input.lower().startswith("/ollama"):
-            args = user_input.split()
-            def safe_dict(obj):
-                # Recursively convert objects to dicts and handle datetime
-                if hasattr(obj, "__dict__"):
-                    d = {}
-                    for k, v in obj.__dict__.items():
-                        if hasattr(v, "isoformat"):  # datetime
-                            d[k] = v.isoformat()
-                        elif hasattr(v, "__dict__"):  # nested object
-                            d[k] = safe_dict(v)
-                        elif isinstance(v, list):
-                            d[k] = [safe_dict(i) for i in v]
-                        elif callable(v):
-                            continue
-                        else:
-                            d[k] = v
-                    return d
-                elif isinstance(obj, list):
-                    return [safe_dict(i) for i in obj]
+                elif len(args) > 1 and args[1].lower() == "show":
+                    try:
+                        print(f"Current system prompt:")
+                        print(f"{system_prompt}")
+                    except NameError:
+                        print("System prompt is not set.")
                 else:
-                    return obj
-            if len(args) > 1 and args[1].lower() == "raw-list":
-                print("\nOllama Raw Models Response:")
-                models_response = list_models()
-                print(json.dumps(safe_dict(models_response), indent=2, ensure_ascii=False))
-                print()
-                continue
-            elif len(args) > 1 and args[1].lower() == "raw-ps":
-                print("\nOllama Raw Processes Response:")
-                processes_response = list_running_models()
-                print(json.dumps(safe_dict(processes_response), indent=2, ensure_ascii=False))
+                    print("  Options:")
+                    print("        /system set")
+                    print("        /system show")
+
                 print()
                 continue
-            elif len(args) > 2 and args[1].lower() == "pull":
-                model_name = ' '.join(args[2:])
-                print(f"\nPulling Ollama model: {model_name}")
-                try:
-                    result_response = pull_model(model_name)
-                    # Use model_dump if available, else safe_dict
-                    if hasattr(result_response, "model_dump"):
-                        result = result_response.model_dump()
+
+            # /ollama commands
+            if user_input.lower().startswith("/ollama"):
+                args = user_input.split()
+                def safe_dict(obj):
+                    # Recursively convert objects to dicts and handle datetime
+                    if hasattr(obj, "__dict__"):
+                        d = {}
+                        for k, v in obj.__dict__.items():
+                            if hasattr(v, "isoformat"):  # datetime
+                                d[k] = v.isoformat()
+                            elif hasattr(v, "__dict__"):  # nested object
+                                d[k] = safe_dict(v)
+                            elif isinstance(v, list):
+                                d[k] = [safe_dict(i) for i in v]
+                            elif callable(v):
+                                continue
+                            else:
+                                d[k] = v
+                        return d
+                    elif isinstance(obj, list):
+                        return [safe_dict(i) for i in obj]
                     else:
-                        result = getattr(result_response, "dict", result_response)
-                        def safe_dict(obj):
-                            if hasattr(obj, "__dict__"):
-                                d = {}
-                                for k, v in obj.__dict__.items():
-                                    if hasattr(v, "isoformat"):
-                                        d[k] = v.isoformat()
-                                    elif hasattr(v, "__dict__"):
-                                        d[k] = safe_dict(v)
-                                    elif isinstance(v, list):
-                                        d[k] = [safe_dict(i) for i in v]
-                                    elif callable(v):
+                        return obj
+                if len(args) > 1 and args[1].lower() == "raw-list":
+                    print("\nOllama Raw Models Response:")
+                    models_response = list_models()
+                    print(json.dumps(safe_dict(models_response), indent=2, ensure_ascii=False))
+                    print()
+                    continue
+                elif len(args) > 1 and args[1].lower() == "raw-ps":
+                    print("\nOllama Raw Processes Response:")
+                    processes_response = list_running_models()
+                    print(json.dumps(safe_dict(processes_response), indent=2, ensure_ascii=False))
+                    print()
+                    continue
+                elif len(args) > 2 and args[1].lower() == "pull":
+                    pull_args = args[2:]
+                    wait = "--wait" in pull_args
+                    model_names = [a for a in pull_args if a != "--wait"]
+                    if not model_names:
+                        print("  Usage: /ollama pull [--wait] <model> [<model> ...]")
+                        print()
+                        continue
+                    jobs = [pull_manager.pull(model_name) for model_name in model_names]
+                    print(f"\nPulling Ollama model(s) in the background: {', '.join(model_names)}")
+                    if wait:
+                        try:
+                            # Ctrl+C only interrupts while a turn is marked as running; otherwise it exits herder.
+                            with session.responding_turn():
+                                ok = pull_manager.wait(jobs)
+                            print("  All pulls finished." if ok else "  Some pulls failed; see /ollama pulls.")
+                        except KeyboardInterrupt:
+                            print("  Stopped waiting; pulls continue in the background.")
+                    else:
+                        print("  Use /ollama pulls to check progress.")
+                    print()
+                    continue
+                elif len(args) > 1 and args[1].lower() == "pulls":
+                    print("\nOllama pulls:")
+                    print(pull_manager.describe())
+                    print()
+                    continue
+                else:
+                    print("  Options:")
+                    print("        /ollama raw-list")
+                    print("        /ollama raw-ps")
+                    print("        /ollama pull [--wait] <model> [<model> ...]")
+                    print("        /ollama pulls")
+                    print()
+                    continue
+
+            if user_input.lower().startswith("/call"):
+                args = user_input.split(maxsplit=2)
+                if len(args) < 2:
+                    print("Usage: /call toolname param1=value1 param2=value2 ... OR /call toolname {\"param1\":value1, ...}")
+                    print()
+                    continue
+                toolname = args[1]
+                params = {}
+                # Support: /call toolname {json}
+                if len(args) > 2 and args[2].strip().startswith('{') and args[2].strip().endswith('}'):
+                    try:
+                        params = json.loads(args[2].strip())
+                    except Exception as e:
+                        print(f"Error parsing JSON for tool params: {e}")
+                        continue
+                else:
+                    # Support: /call toolname param1=value1 param2=value2 ...
+                    for arg in args[2:] if len(args) > 2 else []:
+                        for pair in arg.split():
+                            if '=' in pair:
+                                k, v = pair.split('=', 1)
+                                v = v.strip()
+                                if (v.startswith('{') and v.endswith('}')) or (v.startswith('[') and v.endswith(']')):
+                                    try:
+                                        v = json.loads(v)
+                                    except Exception as e:
+                                        print(f"Error parsing JSON for {k}: {e}")
                                         continue
-                                    else:
-                                        d[k] = v
-                                return d
-                            elif isinstance(obj, list):
-                                return [safe_dict(i) for i in obj]
-                            else:
-                                return obj
-                        result = safe_dict(result)
-                    print(json.dumps(result, indent=2, ensure_ascii=False))
+                                params[k] = v
+                tool = next((t for t in mcptools + nativetools if getattr(t, "name", getattr(t, "__name__", str(t))) == toolname), None)
+                if not tool:
+                    print(f"Tool '{toolname}' not found.")
+                    print()
+                    continue
+                args_str = ', '.join(f"{k}={json.dumps(v) if isinstance(v, (dict, list)) else v}" for k, v in params.items())
+                print(f"\n  \033[90mtool call:\033[0m {toolname}({args_str})")
+                try:
+                    result = tool(**params)
+                    print(f"  \033[90mtool results:\033[90m \033[0m")
+                    print(f"{json.dumps(result, indent=2, ensure_ascii=False) if isinstance(result, (dict, list)) else result}")
+                    print(f"  \033[90m/end of tool results\033[90m \033[0m\n")
                 except Exception as e:
-                    print(json.dumps({"error": str(e)}, indent=2, ensure_ascii=False))
-                print()
-                continue
-            else:
-                print("  Options:")
-                print("        /ollama raw-list")
-                print("        /ollama raw-ps")
-                print("        /ollama pull <model>")
+                    print(f"Error calling tool '{toolname}': {e}")
                 print()
                 continue
 
-        if user_input.lower().startswith("/call"):
-            args = user_input.split(maxsplit=2)
-            if len(args) < 2:
-                print("Usage: /call toolname param1=value1 param2=value2 ... OR /call toolname {\"param1\":value1, ...}")
+            if user_input.lower().startswith("/exit") or user_input.lower().startswith("/quit"):
+                break
+
+            if user_input.lower().startswith("/"):
+                print("Run /help or /? for command options.")
                 print()
                 continue
-            toolname = args[1]
-            params = {}
-            # Support: /call toolname {json}
-            if len(args) > 2 and args[2].strip().startswith('{') and args[2].strip().endswith('}'):
-                try:
-                    params = json.loads(args[2].strip())
-                except Exception as e:
-                    print(f"Error parsing JSON for tool params: {e}")
-                    continue
-            else:
-                # Support: /call toolname param1=value1 param2=value2 ...
-                for arg in args[2:] if len(args) > 2 else []:
-                    for pair in arg.split():
-                        if '=' in pair:
-                            k, v = pair.split('=', 1)
-                            v = v.strip()
-                            if (v.startswith('{') and v.endswith('}')) or (v.startswith('[') and v.endswith(']')):
-                                try:
-                                    v = json.loads(v)
-                                except Exception as e:
-                                    print(f"Error parsing JSON for {k}: {e}")
-                                    continue
-                            params[k] = v
-            tool = next((t for t in mcptools if getattr(t, "name", getattr(t, "__name__", str(t))) == toolname), None)
-            if not tool:
-                print(f"Tool '{toolname}' not found.")
-                print()
+
+            if user_input.strip() == "":
                 continue
-            args_str = ', '.join(f"{k}={json.dumps(v) if isinstance(v, (dict, list)) else v}" for k, v in params.items())
-            print(f"\n  \033[90mtool call:\033[0m {toolname}({args_str})")
-            try:
-                result = tool(**params)
-                print(f"  \033[90mtool results:\033[90m \033[0m")
-                print(f"{json.dumps(result, indent=2, ensure_ascii=False) if isinstance(result, (dict, list)) else result}")
-                print(f"  \033[90m/end of tool results\033[90m \033[0m\n")
-            except Exception as e:
-                print(f"Error calling tool '{toolname}': {e}")
-            print()
-            continue
 
-        if user_input.lower().startswith("/exit") or user_input.lower().startswith("/quit"):
-            break
+            print(f"\033[90m  User ({get_timestamp()}):\033[0m")
 
-        if user_input.lower().startswith("/"):
-            print("Run /help or /? for command options.")
+            print(f"{user_input}")
             print()
-            continue
 
-        if user_input.strip() == "":
-            continue
-
-        print(f"\033[90m  User ({get_timestamp()}):\033[0m")
-
-        print(f"{user_input}")
-        print()
 
+            # Inject some contextual info into the chat.
+            user_input = f"""
+                    Additional Info From User Client:
+                    Current timestamp: {get_timestamp()}
+                    --- Begin User Message ---
+                    {user_input}
+                    """
 
-        # Inject some contextual info into the chat.
-        user_input = f"""
-                Additional Info From User Client:
-                Current timestamp: {get_timestamp()}
-                --- Begin User Message ---
-                {user_input}
-                """
-
-        print(f"\033[90m  {model} ({get_timestamp()}):\033[0m")
-        tools = fn_adapter_mcp2ollama(mcptools)
-        messages = stream_llm_with_tools(model=model, user_input=user_input, tools=tools, system_prompt=system_prompt, messages=messages, mcptools=mcptools)
-        print()
-        print()
+            race = Race(racers, race_stats, race_hedge) if racers else None
+            print(f"\033[90m  {race_label(racers) if race else model} ({get_timestamp()}):\033[0m")
+            tools = fn_adapter_mcp2ollama(mcptools, nativetools)
+            try:
+                with session.responding_turn(), replay_turn(client):
+                    messages = stream_llm_with_tools(model=model, user_input=user_input, tools=tools, system_prompt=system_prompt, messages=messages, mcptools=mcptools, tool_policy=tool_policy, profile=resolve_profile(profiles, model, profile_name), client=client, race=race)
+            except KeyboardInterrupt:
+                # Ctrl+C landed just outside the response; the turn is already over.
+                pass
+            print()
+            print()
+    finally:
+        session.stop()
 
     return messages
 
@@ -439,6 +740,12 @@ def gradient_rainbowify(text):
         result += f"\033[1;{color}m{line}\033[0m\n"
     return result
 
+def race_label(racers) -> str:
+    """
+    Returns the header shown for a raced response, e.g. "race: llama3.2, qwen3@http://gpu:11434".
+    """
+    return "race: " + ", ".join(racer.label for racer in racers)
+
 def get_timestamp() -> str:
     """
     Returns the current timestamp in ISO 8601 format.
@@ -0,0 +1,315 @@
+import contextlib
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, List, Optional
+
+import ollama
+
+CASSETTE_VERSION = 1
+
+
+def _jsonable(value):
+    """Round-trip a value through JSON so the cassette holds plain data."""
+    return json.loads(json.dumps(value, default=str, ensure_ascii=False))
+
+
+class CassetteRecorder:
+    """
+    Records a session to a JSONL cassette: every `client.chat` request with its streamed chunks
+    and their timing, and every tool call with its arguments, result and duration.
+
+    Records are written as soon as they complete, so a crashed session still leaves a usable cassette.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "w", encoding="utf-8")
+        self._write({"type": "header", "version": CASSETTE_VERSION, "created": time.time()})
+
+    def _write(self, record: dict):
+        with self.lock:
+            self.file.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def client(self, client: Optional[ollama.Client] = None) -> "RecordingClient":
+        return RecordingClient(self, client or ollama.Client())
+
+    def mcp_tools(self, mcptools: List) -> List:
+        for tool in mcptools:
+            self._write({
+                "type": "tool_definition",
+                "kind": "mcp",
+                "name": getattr(tool, "name", tool.__class__.__name__),
+                "description": getattr(tool, "description", ""),
+                "inputs": _jsonable(getattr(tool, "inputs", {})),
+                "output_type": getattr(tool, "output_type", "object"),
+            })
+        return [RecordingTool(self, tool) for tool in mcptools]
+
+    def native_tools(self, nativetools: List[Callable]) -> List[Callable]:
+        wrapped = []
+        for fn in nativetools:
+            self._write({"type": "tool_definition", "kind": "native", "name": fn.__name__, "description": fn.__doc__ or ""})
+            wrapped.append(self._wrap_function(fn))
+        return wrapped
+
+    def _wrap_function(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def recorded(**kwargs):
+            return self._record_call(fn.__name__, kwargs, lambda: fn(**kwargs))
+        return recorded
+
+    def _record_call(self, name: str, arguments, call: Callable):
+        started = time.monotonic()
+        record = {"type": "tool_call", "name": name, "arguments": _jsonable(arguments)}
+        try:
+            result = call()
+            record["result"] = result if isinstance(result, str) else _jsonable(result)
+            return result
+        except Exception as e:
+            record["error"] = str(e)
+            raise
+        finally:
+            record["duration"] = time.monotonic() - started
+            self._write(record)
+
+    def record_chat(self, request: dict, chunks: List[dict], complete: bool):
+        self._write({"type": "chat", "request": request, "chunks": chunks, "complete": complete})
+
+    def summary(self) -> Optional[str]:
+        return None
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class RecordingTool:
+    """Proxy for an MCP tool that records each `forward` call."""
+
+    def __init__(self, recorder: CassetteRecorder, tool):
+        self._recorder = recorder
+        self._tool = tool
+
+    def __getattr__(self, name):
+        return getattr(self._tool, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._tool(*args, **kwargs)
+
+    def forward(self, *args, **kwargs):
+        arguments = args[0] if len(args) == 1 and not kwargs else {"args": list(args), **kwargs}
+        return self._recorder._record_call(self._tool.name, arguments, lambda: self._tool.forward(*args, **kwargs))
+
+
+class RecordingClient:
+    """Wraps an ollama.Client and records each streamed chat with per-chunk timing."""
+
+    def __init__(self, recorder: CassetteRecorder, client: ollama.Client):
+        self.recorder = recorder
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def chat(self, model: str = "", messages=None, *, tools=None, stream: bool = False, **kwargs):
+        request = _jsonable({
+            "model": model,
+            "messages": messages or [],
+            "tools": [getattr(t, "__name__", t) for t in tools or []],
+            **kwargs,
+        })
+        started = time.monotonic()
+        response = self.client.chat(model=model, messages=messages, tools=tools, stream=stream, **kwargs)
+        if not stream:
+            self.recorder.record_chat(request, [{"t": time.monotonic() - started, "chunk": response.model_dump(mode="json", exclude_none=True)}], True)
+            return response
+        return self._stream(request, started, response)
+
+    def _stream(self, request: dict, started: float, response):
+        chunks = []
+        complete = False
+        try:
+            for chunk in response:
+                chunks.append({"t": time.monotonic() - started, "chunk": chunk.model_dump(mode="json", exclude_none=True)})
+                yield chunk
+            complete = True
+        finally:
+            self.recorder.record_chat(request, chunks, complete)
+
+
+class CassettePlayer:
+    """
+    Serves a recorded cassette back without Ollama or MCP servers.
+
+    Chat requests are answered in recorded order; tool results are served in recorded order per tool.
+    `speed` scales the recorded delays: 0 replays as fast as possible, 1 with the recorded latency.
+
+    The summary's herder overhead is measured only while herder is busy: inside a turn (see
+    `replay_turn`), a replayed chat stream or a tool call, minus the simulated latency. Startup and
+    time spent waiting for the user are not counted.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = max(float(speed), 0.0)
+        self.tool_definitions = []
+        self.chats = deque()
+        self.tool_calls = defaultdict(deque)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                kind = record.get("type")
+                if kind == "header" and record.get("version") != CASSETTE_VERSION:
+                    raise ValueError(f"Unsupported cassette version {record.get('version')} in '{path}'.")
+                elif kind == "tool_definition":
+                    self.tool_definitions.append(record)
+                elif kind == "chat":
+                    self.chats.append(record)
+                elif kind == "tool_call":
+                    self.tool_calls[record["name"]].append(record)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.simulated = 0.0
+        self.busy = 0.0
+        self._busy_depth = 0
+        self._busy_since = 0.0
+        self.chats_served = 0
+        self.tool_calls_served = 0
+
+    def _sleep(self, seconds: float):
+        delay = seconds * self.speed
+        if delay > 0:
+            time.sleep(delay)
+            with self.lock:
+                self.simulated += delay
+
+    def _enter_busy(self):
+        with self.lock:
+            if self._busy_depth == 0:
+                self._busy_since = time.monotonic()
+            self._busy_depth += 1
+
+    def _exit_busy(self):
+        with self.lock:
+            self._busy_depth -= 1
+            if self._busy_depth == 0:
+                self.busy += time.monotonic() - self._busy_since
+
+    @contextlib.contextmanager
+    def busy_span(self):
+        """Count the enclosed time as herder being busy; nested and overlapping spans count once."""
+        self._enter_busy()
+        try:
+            yield
+        finally:
+            self._exit_busy()
+
+    def client(self, client=None) -> "ReplayClient":
+        return ReplayClient(self)
+
+    def mcp_tools(self, mcptools: Optional[List] = None) -> List:
+        """Stand-ins for the recorded MCP tools; the live ones (if any) are ignored."""
+        return [ReplayTool(self, d) for d in self.tool_definitions if d.get("kind") == "mcp"]
+
+    def native_tools(self, nativetools: Optional[List[Callable]] = None) -> List[Callable]:
+        """Stand-ins for the recorded native tools, so replays never touch the filesystem or run commands."""
+        replayed = []
+        for definition in self.tool_definitions:
+            if definition.get("kind") != "native":
+                continue
+            def replay(_name=definition["name"], **kwargs):
+                return self.serve_tool_call(_name, kwargs)
+            replay.__name__ = definition["name"]
+            replay.__doc__ = definition.get("description", "")
+            replayed.append(replay)
+        return replayed
+
+    def serve_tool_call(self, name: str, arguments):
+        with self.busy_span():
+            with self.lock:
+                if not self.tool_calls[name]:
+                    raise RuntimeError(f"Cassette '{self.path}' has no more recorded calls for tool '{name}'.")
+                record = self.tool_calls[name].popleft()
+                self.tool_calls_served += 1
+            self._sleep(record.get("duration", 0.0))
+            if "error" in record:
+                raise RuntimeError(record["error"])
+            return record.get("result")
+
+    def next_chat(self, model: str) -> dict:
+        with self.lock:
+            if not self.chats:
+                raise RuntimeError(f"Cassette '{self.path}' has no more recorded chat requests.")
+            record = self.chats.popleft()
+            self.chats_served += 1
+        recorded_model = record["request"].get("model")
+        if recorded_model != model:
+            print(f"  \033[90m[replay: request for {model} served from a recording of {recorded_model}]\033[0m")
+        return record
+
+    def summary(self) -> str:
+        wall = time.monotonic() - self.started
+        return (f"replayed {self.chats_served} chat requests and {self.tool_calls_served} tool calls: {self.busy:.3f}s busy "
+                f"({self.simulated:.3f}s recorded latency, {max(self.busy - self.simulated, 0.0):.3f}s herder overhead), {wall:.3f}s wall")
+
+    def close(self):
+        pass
+
+
+class ReplayTool:
+    """Offline stand-in for an MCP tool, with the recorded name, description and input schema."""
+
+    def __init__(self, player: CassettePlayer, definition: dict):
+        self.player = player
+        self.name = definition["name"]
+        self.description = definition.get("description", "")
+        self.inputs = definition.get("inputs", {})
+        self.output_type = definition.get("output_type", "object")
+
+    def forward(self, *args, **kwargs):
+        arguments = args[0] if len(args) == 1 and not kwargs else kwargs
+        return self.player.serve_tool_call(self.name, arguments)
+
+    def __call__(self, *args, **kwargs):
+        return self.forward(*args, **kwargs)
+
+
+class ReplayClient:
+    """Offline stand-in for ollama.Client that streams recorded chunks."""
+
+    def __init__(self, player: CassettePlayer):
+        self.player = player
+
+    def chat(self, model: str = "", messages=None, *, tools=None, stream: bool = False, **kwargs):
+        record = self.player.next_chat(model)
+        if not stream:
+            with self.player.busy_span():
+                chunks = record["chunks"]
+                self.player._sleep(chunks[-1]["t"] if chunks else 0.0)
+                return ollama.ChatResponse.model_validate(chunks[-1]["chunk"]) if chunks else None
+        return self._stream(record)
+
+    def _stream(self, record: dict):
+        with self.player.busy_span():
+            previous = 0.0
+            for entry in record["chunks"]:
+                self.player._sleep(entry["t"] - previous)
+                previous = entry["t"]
+                yield ollama.ChatResponse.model_validate(entry["chunk"])
+
+
+def replay_turn(client):
+    """
+    Context for one model turn: when `client` replays a cassette, the whole turn (including the
+    processing between chat requests) counts towards the replay's measured herder overhead.
+    """
+    if isinstance(client, ReplayClient):
+        return client.player.busy_span()
+    return contextlib.nullcontext()
@@ -0,0 +1,192 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from herder.utils.deadlines import current_cancel_event
+
+# Bound at import time: main.py temporarily patches subprocess.Popen to silence MCP server stderr,
+# which would otherwise swallow the stderr of every command we run.
+_Popen = subprocess.Popen
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_OUTPUT = 32 * 1024
+
+# A command producing more than this is stopped even if it is still within its time limit.
+MAX_TOTAL_OUTPUT = 64 * 1024 * 1024
+
+READ_CHUNK_SIZE = 64 * 1024
+POLL_INTERVAL = 0.05
+KILL_GRACE_PERIOD = 2.0
+# Time a tool-call deadline should allow beyond the command timeout, so the command tool can kill the
+# process group and report its own timeout first (SIGTERM wait plus output drain, then a margin).
+COMMAND_TIMEOUT_GRACE = 2 * KILL_GRACE_PERIOD + 1.0
+
+
+class OutputBuffer:
+    """
+    Bounded capture of a command's output.
+
+    Keeps the first `head_size` bytes verbatim and the last `tail_size` bytes in a ring,
+    so memory use stays fixed no matter how much the command prints.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.head_size = max_bytes // 2
+        self.tail_size = max_bytes - self.head_size
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_bytes = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self.lock:
+            self.total += len(data)
+            if len(self.head) < self.head_size:
+                take = self.head_size - len(self.head)
+                self.head += data[:take]
+                data = data[take:]
+            if not data:
+                return
+            self.tail.append(data)
+            self.tail_bytes += len(data)
+            while self.tail and self.tail_bytes - len(self.tail[0]) >= self.tail_size:
+                self.tail_bytes -= len(self.tail.popleft())
+
+    def render(self) -> str:
+        with self.lock:
+            tail = b"".join(self.tail)[-self.tail_size:] if self.tail_size else b""
+            omitted = self.total - len(self.head) - len(tail)
+            text = self.head.decode("utf-8", errors="replace")
+            if omitted > 0:
+                text += f"\n[... {omitted} bytes omitted ...]\n"
+            return text + tail.decode("utf-8", errors="replace")
+
+
+def _kill_process_group(proc: subprocess.Popen, reader: Optional[threading.Thread] = None):
+    """
+    Terminate the command and everything it spawned, escalating to SIGKILL if needed.
+    Also used after the command has exited, to stop background processes it left behind; with the
+    output `reader`, the grace period ends as soon as every process has closed the output pipe.
+    """
+    if os.name == "posix":
+        deadline = time.monotonic() + KILL_GRACE_PERIOD
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            proc.wait()
+            return
+        try:
+            proc.wait(timeout=KILL_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            pass
+        if reader is not None:
+            reader.join(timeout=max(deadline - time.monotonic(), 0))
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    elif proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+
+def _pump(stream, buffer: OutputBuffer):
+    fd = stream.fileno()
+    while True:
+        data = os.read(fd, READ_CHUNK_SIZE)
+        if not data:
+            break
+        buffer.write(data)
+    stream.close()
+
+
+def run_command_capture(command: str, cwd: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT, max_output: int = DEFAULT_MAX_OUTPUT) -> str:
+    """
+    Run a shell command in its own process group and return a head/tail summary of its output.
+
+    Args:
+        command (str): Shell command line.
+        cwd (Optional[str]): Working directory.
+        timeout (float): Wall-clock limit in seconds.
+        max_output (int): Number of output bytes kept for the summary.
+
+    Returns:
+        str: Exit code, duration and the captured output.
+
+    The process group is killed when the calling tool call is cancelled or times out,
+    and on Ctrl+C when run directly, before the interrupt is passed on. Once the command exits,
+    anything it left running in the background is killed too.
+    """
+    popen_kwargs = {}
+    if os.name == "posix":
+        popen_kwargs["start_new_session"] = True
+    else:
+        popen_kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+
+    buffer = OutputBuffer(max_output)
+    started = time.monotonic()
+    proc = _Popen(
+        command,
+        shell=True,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        **popen_kwargs,
+    )
+    reader = threading.Thread(target=_pump, args=(proc.stdout, buffer), daemon=True)
+    reader.start()
+
+    cancel = current_cancel_event()
+    stopped = None
+    try:
+        while proc.poll() is None:
+            if cancel is not None and cancel.is_set():
+                stopped = "cancelled"
+            elif time.monotonic() - started > timeout:
+                stopped = f"timed out after {timeout}s"
+            elif buffer.total > MAX_TOTAL_OUTPUT:
+                stopped = f"stopped after exceeding {MAX_TOTAL_OUTPUT} bytes of output"
+            if stopped:
+                break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        # Runs on normal exit too: background children would otherwise outlive the tool call and keep
+        # the output pipe open.
+        _kill_process_group(proc, reader)
+        reader.join(timeout=KILL_GRACE_PERIOD)
+
+    duration = time.monotonic() - started
+    lines = [f"exit code: {proc.returncode}", f"duration: {duration:.2f}s"]
+    if stopped:
+        lines.append(f"status: {stopped}")
+    lines.append(f"--- output ({buffer.total} bytes) ---")
+    lines.append(buffer.render())
+    return "\n".join(lines)
+
+
+def make_command_tools(cwd: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT, max_output: int = DEFAULT_MAX_OUTPUT) -> List[Callable]:
+    """
+    Build the native command tool. `timeout` is the upper bound the model may ask for.
+    """
+    def run_command(command: str, timeout_seconds: int = int(timeout)) -> str:
+        """
+        Run a shell command and return its exit code and a summary of its combined stdout/stderr.
+        Long output is shortened to its beginning and end.
+
+        Args:
+            command: Shell command line to run.
+            timeout_seconds: Wall-clock limit in seconds; the command and its children are killed when it is reached.
+
+        Returns:
+            The exit code, duration and captured output.
+        """
+        limit = min(max(float(timeout_seconds), 1.0), timeout)
+        return run_command_capture(command, cwd=cwd, timeout=limit, max_output=max_output)
+
+    return [run_command]
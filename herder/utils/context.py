@@ -0,0 +1,63 @@
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+# Tool results shorter than this are cheaper to resend than to replace with a back-reference.
+MIN_DEDUPE_CHARS = 256
+
+# Parts of a payload that differ between otherwise identical tool results.
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(content: str) -> str:
+    """
+    Content hash of a tool payload that ignores whitespace, case and timestamps,
+    so near-identical results of repeated calls share a fingerprint.
+    """
+    normalized = _WHITESPACE_RE.sub(" ", _TIMESTAMP_RE.sub("<ts>", content)).strip().lower()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def dedupe_fingerprint(message: dict) -> Optional[str]:
+    """Fingerprint of a tool result long enough to be worth deduplicating, else None."""
+    content = message.get("content")
+    if message.get("role") != "tool" or not isinstance(content, str) or len(content) < MIN_DEDUPE_CHARS:
+        return None
+    return fingerprint(content)
+
+
+def prepare_context(messages: List[dict], fingerprints: Optional[List[Optional[str]]] = None) -> List[dict]:
+    """
+    Build the message list sent to the model from the full history.
+
+    Tool results that duplicate a later tool result are replaced by a short back-reference to
+    the latest copy, which is kept in full. `messages` itself is never modified, so the saved
+    history stays complete; when nothing is duplicated it is returned as is.
+
+    `fingerprints`, one `dedupe_fingerprint` per message, can be passed in when they are already
+    known (MessageStore keeps them per record) so payloads are not rehashed on every request.
+    """
+    if fingerprints is None:
+        fingerprints = [dedupe_fingerprint(message) for message in messages]
+    latest: Dict[str, int] = {}
+    found = {}
+    for i, digest in enumerate(fingerprints):
+        if digest is not None:
+            found[i] = digest
+            latest[digest] = i
+
+    if len(latest) == len(found):
+        return messages
+
+    prepared = list(messages)
+    for i, digest in found.items():
+        keep = latest[digest]
+        if keep != i:
+            # Name the kept copy by what the model can see (its tool, later in the conversation), not by list index.
+            name = messages[keep].get("name", "tool")
+            prepared[i] = {
+                **messages[i],
+                "content": f"[Duplicate result omitted: same output as the later '{name}' tool result below.]",
+            }
+    return prepared
@@ -0,0 +1,221 @@
+import contextvars
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_TOOL_TIMEOUT = 120.0
+DEFAULT_BREAKER_THRESHOLD = 3
+DEFAULT_BREAKER_COOLDOWN = 60.0
+
+# How often the waiting thread wakes up, so Ctrl+C and deadlines are noticed promptly.
+POLL_INTERVAL = 0.1
+
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("herder_tool_cancel_event", default=None)
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """
+    Returns the cancellation event of the tool call running in this thread, if any.
+    Native tools poll it to stop work (and kill subprocesses) once the call times out or is cancelled.
+    """
+    return _cancel_event.get()
+
+
+class ToolCallError(Exception):
+    """A tool call that did not produce a result. `payload` is the structured error returned to the model."""
+
+    def __init__(self, payload: dict):
+        super().__init__(payload.get("detail", payload.get("error")))
+        self.payload = payload
+
+    def to_json(self) -> str:
+        return json.dumps(self.payload, ensure_ascii=False)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive timeouts and rejects calls for `cooldown` seconds.
+    After the cooldown a single trial call is let through; a success closes the breaker again.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, cooldown: float = DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until a call is allowed again; 0 when the breaker lets calls through."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0:
+                # Half-open: allow one trial call and re-arm the cooldown in case it also times out.
+                self.opened_at = time.monotonic()
+                return 0.0
+            return remaining
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_timeout(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class ToolPolicy:
+    """
+    Deadlines and circuit breakers for tool calls.
+
+    Timeouts are resolved per tool, then per MCP server, then the global default.
+    Breakers are kept per MCP server, or per tool for native tools.
+
+    Config (the MCP config file):
+        {
+            "tool_timeout": 120,
+            "tool_timeouts": {"run_command": 600},
+            "circuit_breaker": {"threshold": 3, "cooldown": 60},
+            "servers": [
+                {"name": "pubmedmcp", "command": "...", "timeout": 30, "tool_timeouts": {"search_abstracts": 60}}
+            ]
+        }
+    """
+
+    def __init__(self, default_timeout: float = DEFAULT_TOOL_TIMEOUT, tool_timeouts: Optional[Dict[str, float]] = None,
+                 server_timeouts: Optional[Dict[str, float]] = None, breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN):
+        self.default_timeout = float(default_timeout)
+        self.tool_timeouts = {k: float(v) for k, v in (tool_timeouts or {}).items()}
+        self.server_timeouts = {k: float(v) for k, v in (server_timeouts or {}).items()}
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.tool_servers: Dict[str, str] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "ToolPolicy":
+        config = config or {}
+        tool_timeouts = {}
+        server_timeouts = {}
+        for server in config.get("servers", []):
+            name = server.get("name", server.get("command"))
+            if "timeout" in server:
+                server_timeouts[name] = server["timeout"]
+            tool_timeouts.update(server.get("tool_timeouts", {}))
+        # Top-level per-tool timeouts win over the ones nested in a server entry.
+        tool_timeouts.update(config.get("tool_timeouts", {}))
+        breaker = config.get("circuit_breaker", {})
+        return cls(
+            default_timeout=config.get("tool_timeout", DEFAULT_TOOL_TIMEOUT),
+            tool_timeouts=tool_timeouts,
+            server_timeouts=server_timeouts,
+            breaker_threshold=breaker.get("threshold", DEFAULT_BREAKER_THRESHOLD),
+            breaker_cooldown=breaker.get("cooldown", DEFAULT_BREAKER_COOLDOWN),
+        )
+
+    def map_servers(self, server_names: List[str], server_tools: List[List], adapted_tools: Optional[List] = None):
+        """
+        Record which MCP server provides each tool. `server_tools` is one list of MCP tool definitions per
+        server; `adapted_tools` is the flat list of adapted tools, in the same order.
+
+        Tools are called by their adapted name, which mcpadapt sanitizes (e.g. 'search-papers' becomes
+        'search_papers'), so that is the name recorded; per-tool timeouts given under the MCP name carry over.
+        """
+        adapted = iter(adapted_tools) if adapted_tools is not None else None
+        for server_name, tools in zip(server_names, server_tools):
+            for tool in tools:
+                mcp_name = getattr(tool, "name", str(tool))
+                name = getattr(next(adapted, None), "name", mcp_name) if adapted else mcp_name
+                self.tool_servers[name] = server_name
+                if name != mcp_name and mcp_name in self.tool_timeouts:
+                    self.tool_timeouts.setdefault(name, self.tool_timeouts[mcp_name])
+
+    def default_tool_timeout(self, tool_name: str, timeout: float):
+        """Use `timeout` for `tool_name` unless the config already sets one for it."""
+        self.tool_timeouts.setdefault(tool_name, float(timeout))
+
+    def max_timeout(self) -> float:
+        return max([self.default_timeout, *self.tool_timeouts.values(), *self.server_timeouts.values()])
+
+    def timeout_for(self, tool_name: str) -> float:
+        if tool_name in self.tool_timeouts:
+            return self.tool_timeouts[tool_name]
+        server = self.tool_servers.get(tool_name)
+        if server in self.server_timeouts:
+            return self.server_timeouts[server]
+        return self.default_timeout
+
+    def _breaker_for(self, tool_name: str) -> CircuitBreaker:
+        key = self.tool_servers.get(tool_name, tool_name)
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return self.breakers[key]
+
+    def call(self, tool_name: str, tool: Callable, tool_args: dict):
+        """
+        Run `tool(**tool_args)` in a worker thread under the tool's deadline.
+
+        Raises ToolCallError when the breaker is open, the deadline passes, or the user hits Ctrl+C.
+        Only the tool call is abandoned; the caller can hand the error to the model and carry on.
+        """
+        server = self.tool_servers.get(tool_name)
+        breaker = self._breaker_for(tool_name)
+        retry_after = breaker.retry_after()
+        if retry_after > 0:
+            raise ToolCallError({
+                "error": "circuit_open",
+                "tool": tool_name,
+                "server": server,
+                "retry_after_seconds": round(retry_after, 1),
+                "detail": f"'{server or tool_name}' timed out {breaker.failures} times in a row; calls are paused.",
+            })
+
+        timeout = self.timeout_for(tool_name)
+        cancel = threading.Event()
+        done = threading.Event()
+        outcome = {}
+
+        def target():
+            _cancel_event.set(cancel)
+            try:
+                outcome["result"] = tool(**tool_args)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(target,), daemon=True, name=f"tool-{tool_name}")
+        worker.start()
+        deadline = time.monotonic() + timeout
+        try:
+            while not done.wait(POLL_INTERVAL):
+                if time.monotonic() >= deadline:
+                    cancel.set()
+                    breaker.record_timeout()
+                    raise ToolCallError({
+                        "error": "timeout",
+                        "tool": tool_name,
+                        "server": server,
+                        "timeout_seconds": timeout,
+                        "detail": f"Tool '{tool_name}' did not respond within {timeout}s.",
+                    })
+        except KeyboardInterrupt:
+            cancel.set()
+            raise ToolCallError({
+                "error": "cancelled",
+                "tool": tool_name,
+                "server": server,
+                "detail": f"Tool '{tool_name}' was cancelled by the user.",
+            })
+
+        breaker.record_success()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
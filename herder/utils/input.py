@@ -4,104 +4,210 @@ from prompt_toolkit.layout import Layout
 from prompt_toolkit.widgets import Frame, TextArea
 from prompt_toolkit.layout.containers import HSplit, Window
 from prompt_toolkit.layout.controls import FormattedTextControl
-from prompt_toolkit.shortcuts import clear
+from prompt_toolkit.patch_stdout import StdoutProxy
+from contextlib import contextmanager
+from typing import Optional
+import _thread
+import queue
+import signal
 import sys
+import threading
 
-# This fucking input box needs work. -_-
-# It's a temporary mockup of what is desired.
-
-def input_box(prompt_text: str = "> ") -> str:
-    bindings = KeyBindings()
-
-    # Add a mode toggle for ENTER behavior
-    enter_mode = {'submit': True}  # Default mode is submit
-
-    @bindings.add('c-z')
-    def _(event):
-        event.app.current_buffer.text = ""  # Clear the text box
-        event.app.current_buffer.reset()  # Reset the buffer to ensure clearing
-
-    @bindings.add('c-c')
-    def _(event):
-        event.app.exit(exception=KeyboardInterrupt())
-
-    @bindings.add('s-tab')
-    def _(event):
-        enter_mode['submit'] = not enter_mode['submit']  # Toggle the mode
-        event.app.invalidate()  # Refresh the UI to reflect mode change
-
-    @bindings.add('enter')
-    def _(event):
-        if enter_mode['submit']:
-            event.app.exit(result=event.app.current_buffer.text)
-        else:
-            event.app.current_buffer.insert_text('\n')  # Create a new line
-
-    text_area = TextArea(
-        multiline=True,
-        wrap_lines=True,
-        scrollbar=False,
-    )
-
-    def get_help_text():
-        return [
-            ('class:helptext', f'   CTRL+Z to clear   |   CTRL+C to terminate   |   SHIFT+TAB to toggle ENTER mode ({"Submit" if enter_mode["submit"] else "New Line"})')
-        ]
-
-    help_window = Window(
-        content=FormattedTextControl(text=get_help_text),
-        height=1,
-        align='RIGHT',
-        dont_extend_height=True,
-        style='bg:#1a1a1a fg:#888888',
-    )
-
-    def get_height():
-        # Dynamically calculate the height based on the number of lines in the text area
-        return max(text_area.document.line_count + 4, 5)  # Adjusted to grow for the label and spacing
-
-    layout = Layout(
-        HSplit([
-            Window(
-                content=FormattedTextControl(text="  Type your message below."),
-                height=1,
-                align="RIGHT",
-                style="fg:#888888",  # Greyed out text
-                dont_extend_height=True,
-            ),
-            Frame(
-                body=HSplit([
-                    text_area,
-                    help_window
-                ]),
-                height=get_height,  # Ensure the height is dynamically calculated
-            ),
-            Window(height=1),
-        ])
-    )
-
-    app = Application(
-        layout=layout,
-        key_bindings=bindings,
-        full_screen=False,  # Inline mode, preserves prior output
-        mouse_support=False,
-        output=None,
-        input=None,
-    )
-
-    try:
-        result = app.run()
-        # Calculate the actual height used by the layout for clearing
-        box_height = get_height() + 2  # +2 for spacing windows above and below
-        for _ in range(box_height):
-            sys.stdout.write('\x1b[1A')  # Move cursor up
-            sys.stdout.write('\x1b[2K')  # Clear line
-        sys.stdout.flush()
-        return result or ""
-    except (KeyboardInterrupt, EOFError):
-        box_height = get_height() + 2
-        for _ in range(box_height):
-            sys.stdout.write('\x1b[1A')
-            sys.stdout.write('\x1b[2K')
-        sys.stdout.flush()
-        return None
+
+def _interrupt_main_thread():
+    """
+    Raise KeyboardInterrupt in the main thread, as a real Ctrl+C would.
+    A real SIGINT also wakes the main thread from blocking calls (a socket read while Ollama loads a
+    model, a queue wait); _thread.interrupt_main() only takes effect once such a call returns.
+    """
+    if hasattr(signal, "pthread_kill"):
+        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+    else:
+        _thread.interrupt_main()
+
+
+class _LineStdoutProxy(StdoutProxy):
+    """
+    StdoutProxy that ignores flushes of partial lines.
+    prompt_toolkit repaints the input box over any unfinished line, so streamed
+    tokens are shown a line at a time while the input box is live.
+    """
+
+    def flush(self) -> None:
+        pass
+
+    def flush_all(self) -> None:
+        super().flush()
+
+
+class InputSession:
+    """
+    Persistent input box that stays live while the model is streaming.
+
+    The prompt_toolkit Application is built once and runs in a background thread.
+    Submitted messages go into a queue; `get()` hands them to the chat loop one at a time,
+    so messages and slash commands typed during a long response run as soon as the turn ends.
+    Output printed meanwhile is drawn above the input box.
+    """
+
+    def __init__(self):
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.enter_mode = {'submit': True}  # Default mode is submit
+        self.responding = False
+        self.thread = None
+        self.proxy = None
+        self.original_stdout = None
+        self.original_stderr = None
+        self.app = self._build_app()
+
+    def _build_app(self) -> Application:
+        bindings = KeyBindings()
+
+        @bindings.add('c-z')
+        def _(event):
+            event.app.current_buffer.reset()  # Clear the text box
+
+        @bindings.add('c-c')
+        def _(event):
+            if self.responding:
+                # Cancel the response (or the running tool call) without leaving the chat.
+                _interrupt_main_thread()
+            else:
+                self.queue.put(None)
+
+        @bindings.add('s-tab')
+        def _(event):
+            self.enter_mode['submit'] = not self.enter_mode['submit']  # Toggle the mode
+            event.app.invalidate()  # Refresh the UI to reflect mode change
+
+        @bindings.add('enter')
+        def _(event):
+            if self.enter_mode['submit']:
+                text = event.app.current_buffer.text
+                event.app.current_buffer.reset()
+                if text.strip():
+                    self.queue.put(text)
+                event.app.invalidate()
+            else:
+                event.app.current_buffer.insert_text('\n')  # Create a new line
+
+        self.text_area = TextArea(
+            multiline=True,
+            wrap_lines=True,
+            scrollbar=False,
+        )
+
+        def get_label_text():
+            queued = self.queue.qsize()
+            if self.responding:
+                label = "  Responding... messages sent now are queued."
+            else:
+                label = "  Type your message below."
+            if queued:
+                label += f"  ({queued} queued)"
+            return label
+
+        def get_help_text():
+            ctrl_c = "cancel response" if self.responding else "terminate"
+            return [
+                ('class:helptext', f'   CTRL+Z to clear   |   CTRL+C to {ctrl_c}   |   SHIFT+TAB to toggle ENTER mode ({"Submit" if self.enter_mode["submit"] else "New Line"})')
+            ]
+
+        help_window = Window(
+            content=FormattedTextControl(text=get_help_text),
+            height=1,
+            align='RIGHT',
+            dont_extend_height=True,
+            style='bg:#1a1a1a fg:#888888',
+        )
+
+        def get_height():
+            # Dynamically calculate the height based on the number of lines in the text area
+            return max(self.text_area.document.line_count + 4, 5)  # Adjusted to grow for the label and spacing
+
+        layout = Layout(
+            HSplit([
+                Window(
+                    content=FormattedTextControl(text=get_label_text),
+                    height=1,
+                    align="RIGHT",
+                    style="fg:#888888",  # Greyed out text
+                    dont_extend_height=True,
+                ),
+                Frame(
+                    body=HSplit([
+                        self.text_area,
+                        help_window
+                    ]),
+                    height=get_height,  # Ensure the height is dynamically calculated
+                ),
+                Window(height=1),
+            ])
+        )
+
+        return Application(
+            layout=layout,
+            key_bindings=bindings,
+            full_screen=False,  # Inline mode, preserves prior output
+            mouse_support=False,
+            erase_when_done=True,
+        )
+
+    def start(self):
+        """Start the input box thread and route stdout/stderr above it."""
+        self.proxy = _LineStdoutProxy(raw=True)
+        self.original_stdout, self.original_stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = self.proxy
+        ready = threading.Event()
+        # Signal handling only works in the main thread; Ctrl+C is handled by the key binding instead.
+        self.thread = threading.Thread(
+            target=self.app.run,
+            kwargs={'pre_run': ready.set, 'handle_sigint': False},
+            daemon=True,
+            name="herder-input",
+        )
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        """Close the input box and restore stdout/stderr."""
+        if self.thread is None:
+            return
+        if self.app.is_running:
+            self.app.loop.call_soon_threadsafe(self.app.exit)
+        self.thread.join()
+        self.thread = None
+        self.proxy.flush_all()
+        self.proxy.close()
+        sys.stdout, sys.stderr = self.original_stdout, self.original_stderr
+
+    def __enter__(self) -> "InputSession":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _refresh(self):
+        if self.app.is_running:
+            self.app.invalidate()
+
+    def get(self) -> Optional[str]:
+        """Block until the next queued message. Returns None when the user asked to exit."""
+        self.proxy.flush_all()
+        self._refresh()
+        item = self.queue.get()
+        self._refresh()
+        return item
+
+    @contextmanager
+    def responding_turn(self):
+        """Mark a model turn (or another blocking wait) as running: Ctrl+C then interrupts it instead of exiting."""
+        self.responding = True
+        self._refresh()
+        try:
+            yield
+        finally:
+            self.responding = False
+            self.proxy.flush_all()
+            self._refresh()
@@ -1,11 +1,17 @@
 import ollama
 from typing import List, Callable, Optional, Iterator
-import json
+
+from herder.utils.deadlines import ToolPolicy, ToolCallError
+from herder.utils.schema import compile_tool_inputs
+from herder.utils.profiles import ModelProfile
+from herder.utils.context import prepare_context
+from herder.utils.messages import MessageStore
+from herder.utils.race import Race
 
 # Debug flag to control debug output
 ENABLE_DEBUG = False
 
-def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Callable]] = None, system_prompt: Optional[str] = None, enable_thinking: bool = False, messages : List = [], mcptools: Optional[List] = None):
+def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Callable]] = None, system_prompt: Optional[str] = None, enable_thinking: bool = False, messages: Optional[MessageStore] = None, mcptools: Optional[List] = None, tool_policy: Optional[ToolPolicy] = None, profile: Optional[ModelProfile] = None, client=None, race: Optional[Race] = None):
     """
     Streams responses from an LLM and allows sequential tool calls.
 
@@ -15,25 +21,35 @@ def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Call
         tools (List[Callable]): List of callable tool functions.
         system_prompt (Optional[str]): Optional system prompt for the LLM.
         enable_thinking (bool): Flag to enable or disable thinking functionality.
+        messages (Optional[MessageStore]): Chat history; a new store is created if omitted, and a plain list is wrapped.
+        tool_policy (Optional[ToolPolicy]): Deadlines and circuit breakers for tool calls.
+        profile (Optional[ModelProfile]): Runtime options (num_ctx, threads, keep_alive, ...) for the model.
+        client: Ollama client to use (e.g. a cassette recording/replay client); defaults to ollama.Client().
+        race (Optional[Race]): Race the first request across these models/hosts instead of `model`; the
+            winner answers the rest of the turn, including follow-ups after tool calls.
 
     Returns:
-        None
+        MessageStore: The updated chat history.
     """
 
+    if messages is None:
+        messages = MessageStore()
+    elif not isinstance(messages, MessageStore):
+        messages = MessageStore(messages)
+
     # Ensure tools is a list of callables or valid tool definitions
     if not isinstance(tools, list):
         tools = []
     else:
         tools = [t for t in tools if callable(t) or isinstance(t, dict)]
 
+    if tool_policy is None:
+        tool_policy = ToolPolicy()
+
     # Add system prompt if provided and different from the last system prompt
     if system_prompt:
         # Find the last system prompt in the message history
-        last_system_prompt = None
-        for i in range(len(messages) - 1, -1, -1):
-            if messages[i].get("role") == "system":
-                last_system_prompt = messages[i].get("content")
-                break
+        last_system_prompt = messages.last_content("system")
 
         # Only add a new system prompt if it's different from the last one
         if last_system_prompt != system_prompt:
@@ -43,20 +59,45 @@ def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Call
     messages.append({"role": "user", "content": user_input})
 
     # Stream responses from the LLM
-    client = ollama.Client()
+    if client is None:
+        client = ollama.Client()
 
     assistant_content = ""
 
     try:
         # Loop to allow for sequential tool calls
         while True:
-            response: Iterator[ollama.ChatResponse] = client.chat(
-                model=model,
-                stream=True,
-                messages=messages,
-                tools=tools,
-                think=enable_thinking
-            )
+            # Build the request from the store; only the outgoing list is deduplicated, `messages` keeps the full history.
+            history = messages.to_ollama()
+            request_messages = prepare_context(history, messages.fingerprints())
+            if ENABLE_DEBUG and request_messages is not history:
+                saved = sum(len(m.get("content") or "") for m in history) - sum(len(m.get("content") or "") for m in request_messages)
+                print(f"  \033[90mDEBUG: deduplicated tool results, {saved} characters fewer in request\033[0m")
+
+            def runtime_kwargs(model_name):
+                kwargs = {}
+                if profile:
+                    kwargs["options"] = profile.options(model_name, request_messages, tools)
+                    if profile.keep_alive is not None:
+                        kwargs["keep_alive"] = profile.keep_alive
+                    if ENABLE_DEBUG:
+                        print(f"  \033[90mDEBUG: profile {profile.name} for {model_name}: {kwargs}\033[0m")
+                return kwargs
+
+            if race is not None:
+                winner, latency, response = race.chat(options_for=runtime_kwargs, messages=request_messages, tools=tools, think=enable_thinking)
+                print(f"  \033[90m[race won by {winner.label} in {latency:.2f}s]\033[0m")
+                # Stay on the winner for tool-call follow-ups so the turn has a single voice.
+                model, client, race = winner.model, race.client_for(winner), None
+            else:
+                response: Iterator[ollama.ChatResponse] = client.chat(
+                    model=model,
+                    stream=True,
+                    messages=request_messages,
+                    tools=tools,
+                    think=enable_thinking,
+                    **runtime_kwargs(model)
+                )
 
             has_tool_calls = False
 
@@ -119,7 +160,7 @@ def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Call
                                         print(f"  \033[90mDEBUG: {tool_name} input schema: {getattr(original_tool, 'inputs', 'N/A')}\033[0m")
 
                                 try:
-                                    tool_result = tool(**tool_args)
+                                    tool_result = tool_policy.call(tool_name, tool, tool_args)
 
                                     # Print tool results
                                     print(f"  \033[90mtool results:\033[90m \033[0m")
@@ -128,6 +169,9 @@ def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Call
 
                                     # Add tool result to messages
                                     messages.append({"role": "tool", "content": str(tool_result), "name": tool_name})
+                                except ToolCallError as e:
+                                    print(f"  \033[91mtool error: {e}\033[0m\n")
+                                    messages.append({"role": "tool", "content": e.to_json(), "name": tool_name})
                                 except Exception as e:
                                     error_msg = f"Error executing tool '{tool_name}': {str(e)}"
                                     print(f"  \033[91mtool error: {error_msg}\033[0m\n")
@@ -154,188 +198,22 @@ def stream_llm_with_tools(model: str, user_input: str, tools: Optional[List[Call
 
     return messages
 
-# This function is just ass... needs work.
-def parse_tool_arguments(inner_kwargs, param_names, input_keys):
-    """
-    Parse various formats of tool arguments into a proper kwargs dict.
-
-    Args:
-        inner_kwargs: The raw arguments from the LLM (string, dict, etc.)
-        param_names: List of expected parameter names
-        input_keys: Dict of parameter schemas from the tool
-
-    Returns:
-        dict: Parsed arguments ready for the tool
-    """
-    if ENABLE_DEBUG:
-        print(f"  \033[90mDEBUG: parse_tool_arguments input: {inner_kwargs} (type: {type(inner_kwargs)})\033[0m")
-        print(f"  \033[90mDEBUG: param_names: {param_names}\033[0m")
-
-    # If it's already a dict, return it
-    if isinstance(inner_kwargs, dict):
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Processing dict input: {inner_kwargs}\033[0m")
-        return inner_kwargs
-
-    # If it's not a string, treat as single param
-    if not isinstance(inner_kwargs, str):
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Fallback to single param for non-dict/string: {inner_kwargs}\033[0m")
-        if param_names:
-            return {param_names[0]: inner_kwargs}
-        else:
-            return {}
-
-    # String processing
-    if not param_names:
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: No param_names, returning string as-is\033[0m")
-        return {"value": inner_kwargs}
-
-    # Try to parse as JSON if it looks like a dict (do this BEFORE key=value parsing)
-    if (inner_kwargs.strip().startswith('{') and inner_kwargs.strip().endswith('}')):
-        try:
-            parsed = json.loads(inner_kwargs)
-            if ENABLE_DEBUG:
-                print(f"  \033[90mDEBUG: Parsed JSON string to dict: {parsed}\033[0m")
-            return parsed
-        except Exception as e:
-            if ENABLE_DEBUG:
-                print(f"  \033[90mDEBUG: Failed to parse JSON string: {e}\033[0m")
-            # Try converting single quotes to double quotes for Python dict format
-            try:
-                fixed_json = inner_kwargs.replace("'", '"')
-                parsed = json.loads(fixed_json)
-                if ENABLE_DEBUG:
-                    print(f"  \033[90mDEBUG: Parsed Python dict string to dict: {parsed}\033[0m")
-                return parsed
-            except Exception as e2:
-                if ENABLE_DEBUG:
-                    print(f"  \033[90mDEBUG: Failed to parse Python dict string: {e2}\033[0m")
-                # Last resort: try using ast.literal_eval for Python dict strings
-                try:
-                    import ast
-                    parsed = ast.literal_eval(inner_kwargs)
-                    if isinstance(parsed, dict):
-                        if ENABLE_DEBUG:
-                            print(f"  \033[90mDEBUG: Parsed using ast.literal_eval: {parsed}\033[0m")
-                        return parsed
-                except Exception as e3:
-                    if ENABLE_DEBUG:
-                        print(f"  \033[90mDEBUG: Failed to parse with ast.literal_eval: {e3}\033[0m")
-
-    # Try to parse key=value pairs from the string
-    if '=' in inner_kwargs:
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Detected key=value pairs in string: {inner_kwargs}\033[0m")
-
-        # First try comma-separated pairs
-        pairs = [v.strip() for v in inner_kwargs.split(',')]
-        parsed = {}
-
-        # If comma splitting doesn't work well, try space splitting
-        if len(pairs) == 1 and ' ' in inner_kwargs:
-            # Try to split by spaces while preserving key=value pairs
-            import re
-            # Match pattern like "key=value" including quoted values
-            matches = re.findall(r'(\w+)=([^\s=]+)', inner_kwargs)
-            if matches:
-                parsed = {k: v for k, v in matches}
-                if ENABLE_DEBUG:
-                    print(f"  \033[90mDEBUG: Parsed space-separated key-value pairs: {parsed}\033[0m")
-                return parsed
-
-        # Fall back to comma-separated parsing
-        for pair in pairs:
-            if '=' in pair:
-                k, v = pair.split('=', 1)
-                parsed[k.strip()] = v.strip()
-
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Parsed key-value pairs: {parsed}\033[0m")
-        return parsed
-
-    # Try splitting by comma first
-    values = [v.strip() for v in inner_kwargs.split(",") if v.strip()]
-    if ENABLE_DEBUG:
-        print(f"  \033[90mDEBUG: Positional values after comma split: {values}\033[0m")
-
-    # If not enough values, try splitting by space
-    if len(values) != len(param_names):
-        values = [v.strip() for v in inner_kwargs.split() if v.strip()]
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Positional values after space split: {values}\033[0m")
-
-    # If the number of values matches the number of param_names, map them
-    if len(values) == len(param_names):
-        try:
-            mapped = {k: int(v) if input_keys and input_keys.get(k, {}).get('type') == 'integer' else v
-                     for k, v in zip(param_names, values)}
-        except Exception:
-            mapped = {k: v for k, v in zip(param_names, values)}
-        if ENABLE_DEBUG:
-            print(f"  \033[90mDEBUG: Mapped positional args: {mapped}\033[0m")
-        return mapped
-
-    # Fallback: treat as single param
-    if ENABLE_DEBUG:
-        print(f"  \033[90mDEBUG: Fallback to single param for string: {inner_kwargs}\033[0m")
-    if len(param_names) == 1:
-        return {param_names[0]: inner_kwargs}
-    else:
-        return {param_names[0]: inner_kwargs}
-
-
 def fn_adapter_mcp2ollama(mcptools, nativetools=None):
     """
     Adapts MCPAdapt tool objects to Ollama-compatible callables and adds any native callables.
     Each callable exposes the tool's name and description as function name and docstring.
-    Handles single-argument tools by mapping kwargs to the expected input key.
+    Arguments are coerced and validated against the tool's `inputs` schema, compiled once per tool.
     """
     adapted_tools = []
     def make_wrapper(tool):
         input_keys = getattr(tool, "inputs", None)
-        param_names = list(input_keys.keys()) if input_keys and isinstance(input_keys, dict) else []
+        # Compile the input schema once; each call then only coerces and validates.
+        coerce_arguments = compile_tool_inputs(input_keys)
         def wrapper(**kwargs):
-            # Handle case where LLM passes kwargs as a parameter
-            if len(kwargs) == 1 and "kwargs" in kwargs:
-                inner_kwargs = kwargs["kwargs"]
-                if ENABLE_DEBUG:
-                    print(f"  \033[90mDEBUG: Received kwargs wrapper: {inner_kwargs} (type: {type(inner_kwargs)})\033[0m")
-
-                # Use the dedicated parsing function
-                kwargs = parse_tool_arguments(inner_kwargs, param_names, input_keys)
-
-            # If tool expects no inputs (like get_timestamp), ignore any kwargs
-            if not input_keys or (isinstance(input_keys, dict) and len(input_keys) == 0):
-                return tool.forward({})
-
-            # If tool expects a single input, map any kwargs to the expected structure
-            if input_keys and isinstance(input_keys, dict):
-                if len(input_keys) == 1:
-                    expected_key = param_names[0]
-                    # If we get a single kwarg that's not the expected key, map it
-                    if len(kwargs) == 1:
-                        actual_key = list(kwargs.keys())[0]
-                        if actual_key != expected_key:
-                            kwargs = {expected_key: kwargs[actual_key]}
-
-                # For multi-parameter tools, check if we need to wrap in a 'request' object
-                if kwargs and "request" not in kwargs:
-                    input_schema_str = str(input_keys)
-                    if "request" in input_schema_str.lower():
-                        if 'term' in input_schema_str.lower():
-                            if len(kwargs) == 1:
-                                value = list(kwargs.values())[0]
-                                return tool.forward({"request": {"term": value}})
-                            else:
-                                return tool.forward({"request": kwargs})
-                        else:
-                            return tool.forward({"request": kwargs})
-
-                return tool.forward(kwargs)
-
-            return tool.forward(**kwargs)
+            arguments = coerce_arguments(kwargs)
+            if ENABLE_DEBUG:
+                print(f"  \033[90mDEBUG: {wrapper.__name__} coerced arguments: {kwargs} -> {arguments}\033[0m")
+            return tool.forward(arguments)
         wrapper.__name__ = getattr(tool, "name", tool.__class__.__name__)
         wrapper.__doc__ = getattr(tool, "description", "No description available.")
         # Improved docstring: enumerate each parameter
@@ -373,11 +251,6 @@ def list_running_models():
     client = ollama.Client()
     return client.ps()
 
-def pull_model(model: str):
-    """Pull a model from Ollama."""
-    client = ollama.Client()
-    return client.pull(model)
-
 def set_debug_from_main(debug_flag):
     global ENABLE_DEBUG
     ENABLE_DEBUG = debug_flag
@@ -0,0 +1,141 @@
+import sys
+import zlib
+from typing import Iterable, Iterator, List, Optional
+
+from herder.utils.context import dedupe_fingerprint
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+
+except ImportError:
+    _zstd = None
+
+# The most recent messages stay uncompressed; they are the ones read and re-sent most often.
+DEFAULT_HOT_MESSAGES = 32
+
+# Contents smaller than this are not worth compressing.
+DEFAULT_COMPRESS_MIN_CHARS = 4096
+
+_CODEC_ZSTD = 1
+_CODEC_ZLIB = 2
+
+_KNOWN_KEYS = ("role", "content", "name", "tool_calls")
+
+
+def _compress(text: str):
+    data = text.encode("utf-8")
+    if _zstd is not None:
+        return _CODEC_ZSTD, _zstd.compress(data)
+    return _CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def _decompress(codec: int, data: bytes) -> str:
+    if codec == _CODEC_ZSTD:
+        return _zstd.decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+class Message:
+    """
+    One chat message. Role and tool names are interned; large contents can be stored compressed.
+    Tool results keep their dedupe fingerprint, computed once while the content is still plain text.
+    """
+
+    __slots__ = ("role", "name", "tool_calls", "extra", "fingerprint", "_content", "_codec")
+
+    def __init__(self, role: str, content: str = "", name: Optional[str] = None, tool_calls: Optional[list] = None, extra: Optional[dict] = None):
+        self.role = sys.intern(role)
+        self.name = sys.intern(name) if name else None
+        self.tool_calls = tool_calls or None
+        self.extra = extra or None
+        self._content = content or ""
+        self._codec = 0
+        self.fingerprint = dedupe_fingerprint({"role": self.role, "content": self._content})
+
+    @classmethod
+    def from_dict(cls, message: dict) -> "Message":
+        extra = {k: v for k, v in message.items() if k not in _KNOWN_KEYS}
+        return cls(message.get("role", "user"), message.get("content") or "", message.get("name"), message.get("tool_calls"), extra)
+
+    @property
+    def content(self) -> str:
+        if self._codec:
+            return _decompress(self._codec, self._content)
+        return self._content
+
+    @property
+    def compressed(self) -> bool:
+        return bool(self._codec)
+
+    def compress(self, min_chars: int = DEFAULT_COMPRESS_MIN_CHARS):
+        """Store the content compressed if it is large enough and actually shrinks."""
+        if self._codec or len(self._content) < min_chars:
+            return
+        codec, data = _compress(self._content)
+        if len(data) < len(self._content):
+            self._content, self._codec = data, codec
+
+    def to_dict(self) -> dict:
+        """The message in Ollama's chat format."""
+        message = {"role": self.role, "content": self.content}
+        if self.name:
+            message["name"] = self.name
+        if self.tool_calls:
+            message["tool_calls"] = self.tool_calls
+        if self.extra:
+            message.update(self.extra)
+        return message
+
+
+class MessageStore:
+    """
+    Chat history for a session.
+
+    Messages are kept as slotted Message records instead of dicts. Once a message falls out of the
+    `hot_messages` most recent ones, a large content is compressed, so long sessions keep memory
+    proportional to the recent context rather than the whole history. The Ollama-format list is only
+    built when a request needs it.
+    """
+
+    def __init__(self, messages: Optional[Iterable[dict]] = None, hot_messages: int = DEFAULT_HOT_MESSAGES,
+                 compress_min_chars: int = DEFAULT_COMPRESS_MIN_CHARS):
+        self.hot_messages = hot_messages
+        self.compress_min_chars = compress_min_chars
+        self.records: List[Message] = []
+        for message in messages or []:
+            self.append(message)
+
+    def append(self, message):
+        self.records.append(message if isinstance(message, Message) else Message.from_dict(message))
+        cold = len(self.records) - self.hot_messages - 1
+        if cold >= 0:
+            self.records[cold].compress(self.compress_min_chars)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[dict]:
+        return (record.to_dict() for record in self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [record.to_dict() for record in self.records[index]]
+        return self.records[index].to_dict()
+
+    def last_content(self, role: str) -> Optional[str]:
+        """Content of the most recent message with the given role, without building the full list."""
+        for record in reversed(self.records):
+            if record.role == role:
+                return record.content
+        return None
+
+    def to_ollama(self) -> List[dict]:
+        """Build the message list for a chat request."""
+        return [record.to_dict() for record in self.records]
+
+    def fingerprints(self) -> List[Optional[str]]:
+        """Per-message dedupe fingerprints, aligned with `to_ollama()`, for prepare_context."""
+        return [record.fingerprint for record in self.records]
+
+    def to_list(self) -> List[dict]:
+        """Plain list of message dicts, e.g. for saving the history file."""
+        return self.to_ollama()
@@ -0,0 +1,137 @@
+import json
+from typing import Dict, List, Optional
+
+# Context sizes the auto mode chooses from. A fixed set keeps Ollama model reloads rare:
+# the context only changes when a conversation outgrows its bucket.
+CONTEXT_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# Rough token estimate for prompt sizing; errs on the large side for typical English and JSON.
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD_TOKENS = 8
+
+# Tokens kept free for the model's reply when sizing the context.
+DEFAULT_RESPONSE_RESERVE = 2048
+
+AUTO_PROFILE_NAME = "auto"
+
+# Profile keys that are passed through as Ollama options.
+OPTION_KEYS = ("num_thread", "num_batch", "temperature")
+
+
+def estimate_tokens(messages: List[dict], tools: Optional[List] = None) -> int:
+    """Cheap estimate of the prompt size of a chat request, in tokens."""
+    chars = 0
+    for message in messages:
+        chars += len(message.get("content") or "")
+        if message.get("tool_calls"):
+            chars += len(json.dumps(message["tool_calls"], default=str))
+    for tool in tools or []:
+        if callable(tool):
+            chars += len(getattr(tool, "__name__", "")) + len(getattr(tool, "__doc__", None) or "")
+        else:
+            chars += len(json.dumps(tool, default=str))
+    return int(chars / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+
+def pick_context_bucket(needed: int, current: Optional[int] = None, max_ctx: Optional[int] = None) -> int:
+    """
+    Smallest bucket that fits `needed` tokens, capped at `max_ctx`.
+    An already chosen `current` bucket that still fits is kept, so the context never shrinks
+    mid-session and forces a reload.
+    """
+    buckets = [b for b in CONTEXT_BUCKETS if max_ctx is None or b <= max_ctx] or [max_ctx]
+    if current is not None and needed <= current and (max_ctx is None or current <= max_ctx):
+        return current
+    for bucket in buckets:
+        if bucket >= needed:
+            return bucket
+    return buckets[-1]
+
+
+class ModelProfile:
+    """
+    Runtime settings sent with every chat request for a model.
+
+    `num_ctx` is either a fixed size or "auto", which sizes the context per request from
+    CONTEXT_BUCKETS. Any Ollama option not covered by a named key can go into `options`.
+    """
+
+    def __init__(self, name: str, num_ctx=None, num_thread: Optional[int] = None, num_batch: Optional[int] = None,
+                 keep_alive=None, temperature: Optional[float] = None, max_ctx: Optional[int] = None,
+                 response_reserve: int = DEFAULT_RESPONSE_RESERVE, options: Optional[dict] = None):
+        self.name = name
+        self.num_ctx = num_ctx
+        self.num_thread = num_thread
+        self.num_batch = num_batch
+        self.keep_alive = keep_alive
+        self.temperature = temperature
+        self.max_ctx = max_ctx
+        self.response_reserve = response_reserve
+        self.extra_options = dict(options or {})
+        # Last auto-sized context per model, so buckets only ever grow within a session.
+        self.chosen_ctx: Dict[str, int] = {}
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "ModelProfile":
+        return cls(
+            name=name,
+            num_ctx=data.get("num_ctx"),
+            num_thread=data.get("num_thread"),
+            num_batch=data.get("num_batch"),
+            keep_alive=data.get("keep_alive"),
+            temperature=data.get("temperature"),
+            max_ctx=data.get("max_ctx"),
+            response_reserve=data.get("response_reserve", DEFAULT_RESPONSE_RESERVE),
+            options=data.get("options"),
+        )
+
+    @property
+    def auto_ctx(self) -> bool:
+        return isinstance(self.num_ctx, str) and self.num_ctx.lower() == AUTO_PROFILE_NAME
+
+    def context_size(self, model: str, messages: List[dict], tools: Optional[List] = None) -> Optional[int]:
+        if not self.auto_ctx:
+            return self.num_ctx
+        needed = estimate_tokens(messages, tools) + self.response_reserve
+        ctx = pick_context_bucket(needed, self.chosen_ctx.get(model), self.max_ctx)
+        self.chosen_ctx[model] = ctx
+        return ctx
+
+    def options(self, model: str, messages: List[dict], tools: Optional[List] = None) -> dict:
+        """Ollama `options` for one chat request."""
+        options = dict(self.extra_options)
+        for key in OPTION_KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                options[key] = value
+        num_ctx = self.context_size(model, messages, tools)
+        if num_ctx is not None:
+            options["num_ctx"] = num_ctx
+        return options
+
+    def describe(self) -> str:
+        settings = {"num_ctx": self.num_ctx, "num_thread": self.num_thread, "num_batch": self.num_batch,
+                    "keep_alive": self.keep_alive, "temperature": self.temperature, "max_ctx": self.max_ctx}
+        parts = [f"{k}={v}" for k, v in settings.items() if v is not None]
+        parts.extend(f"{k}={v}" for k, v in self.extra_options.items())
+        return f"{self.name} ({', '.join(parts) if parts else 'Ollama defaults'})"
+
+
+def load_profiles(config: Optional[dict]) -> Dict[str, ModelProfile]:
+    """
+    Read `model_profiles` from the config. Profiles are keyed by name; a profile named after a
+    model is used for that model automatically. A built-in "auto" profile only sizes num_ctx.
+    """
+    profiles = {}
+    for name, data in ((config or {}).get("model_profiles") or {}).items():
+        profiles[name] = ModelProfile.from_dict(name, data or {})
+    if AUTO_PROFILE_NAME not in profiles:
+        profiles[AUTO_PROFILE_NAME] = ModelProfile(AUTO_PROFILE_NAME, num_ctx=AUTO_PROFILE_NAME)
+    return profiles
+
+
+def resolve_profile(profiles: Dict[str, ModelProfile], model: str, profile_name: Optional[str] = None) -> Optional[ModelProfile]:
+    """The explicitly selected profile, else the one named after the model, else None (Ollama defaults)."""
+    if profile_name:
+        return profiles.get(profile_name)
+    return profiles.get(model)
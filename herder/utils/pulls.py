@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import ollama
+
+DEFAULT_PULL_CONCURRENCY = 2
+
+# A failed pull is retried this many times in total; Ollama resumes partially downloaded layers.
+MAX_PULL_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 2.0
+
+# Per-layer progress is reported each time a layer crosses another step of this size.
+PROGRESS_STEP_PERCENT = 25
+
+WAIT_REPORT_INTERVAL = 5.0
+
+
+def normalize_model_name(model: str) -> str:
+    """Ollama lists models with an explicit tag, so `llama3` is `llama3:latest`."""
+    return model if ":" in model.rsplit("/", 1)[-1] else f"{model}:latest"
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}{unit}"
+        size /= 1024
+    return f"{size}B"
+
+
+class PullJob:
+    """State of one model pull: overall status plus completed/total bytes per layer digest."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.status = "queued"
+        self.layers: Dict[str, List[int]] = {}
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+    @property
+    def ok(self) -> bool:
+        return self.done.is_set() and self.error is None
+
+    def progress(self):
+        completed = sum(layer[0] for layer in self.layers.values())
+        total = sum(layer[1] for layer in self.layers.values())
+        return completed, total
+
+    def describe(self) -> str:
+        completed, total = self.progress()
+        line = f"{self.model}: {self.status}"
+        if total:
+            line += f" {completed * 100 // total}% ({_format_bytes(completed)}/{_format_bytes(total)})"
+        if self.error:
+            line += f" - {self.error}"
+        if self.attempts > 1:
+            line += f" [attempt {self.attempts}/{MAX_PULL_ATTEMPTS}]"
+        return line
+
+
+class PullManager:
+    """
+    Runs model pulls in the background, at most `concurrency` at a time, streaming progress.
+
+    Progress events are reported through `report` (print by default). Pulls run in daemon
+    threads, so exiting herder never waits for a download to finish.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_PULL_CONCURRENCY, report: Callable[[str], None] = print,
+                 client_factory: Callable[[], ollama.Client] = ollama.Client):
+        self.slots = threading.BoundedSemaphore(max(int(concurrency), 1))
+        self.report = report
+        self.client_factory = client_factory
+        self.jobs: Dict[str, PullJob] = {}
+        self.lock = threading.Lock()
+
+    def _emit(self, job: PullJob, text: str):
+        self.report(f"  \033[90m[pull {job.model}]\033[0m {text}")
+
+    def pull(self, model: str) -> PullJob:
+        """Start pulling `model` in the background, or return the pull already in progress."""
+        with self.lock:
+            job = self.jobs.get(model)
+            if job and not job.done.is_set():
+                return job
+            job = PullJob(model)
+            self.jobs[model] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True, name=f"pull-{model}").start()
+        return job
+
+    def _run(self, job: PullJob):
+        with self.slots:
+            job.started = time.monotonic()
+            while True:
+                job.attempts += 1
+                try:
+                    self._stream(job)
+                    job.status = "success"
+                    job.error = None
+                    break
+                except Exception as e:
+                    job.error = str(e)
+                    if job.attempts >= MAX_PULL_ATTEMPTS:
+                        job.status = "failed"
+                        self._emit(job, f"\033[91mfailed: {e}\033[0m")
+                        break
+                    job.status = "retrying"
+                    self._emit(job, f"error: {e}; retrying (attempt {job.attempts + 1}/{MAX_PULL_ATTEMPTS})")
+                    time.sleep(RETRY_BACKOFF_SECONDS * job.attempts)
+            job.finished = time.monotonic()
+        if job.error is None:
+            self._emit(job, f"done in {job.finished - job.started:.1f}s")
+        job.done.set()
+
+    def _stream(self, job: PullJob):
+        client = self.client_factory()
+        last_status = None
+        reported_steps: Dict[str, int] = {}
+        for update in client.pull(job.model, stream=True):
+            status = update.status or job.status
+            if update.digest:
+                # Layer updates all share a "pulling <digest>" status; report them per layer instead.
+                layer = job.layers.setdefault(update.digest, [0, 0])
+                layer[0] = update.completed or layer[0]
+                layer[1] = update.total or layer[1]
+                if layer[1]:
+                    step = layer[0] * 100 // layer[1] // PROGRESS_STEP_PERCENT * PROGRESS_STEP_PERCENT
+                    if step > reported_steps.get(update.digest, -1):
+                        reported_steps[update.digest] = step
+                        self._emit(job, f"layer {update.digest.removeprefix('sha256:')[:12]} {step}% of {_format_bytes(layer[1])}")
+                job.status = "downloading"
+            else:
+                job.status = status
+                if status != last_status:
+                    self._emit(job, status)
+            last_status = status
+
+    def wait(self, jobs: Iterable[PullJob], report_interval: float = WAIT_REPORT_INTERVAL) -> bool:
+        """Block until all jobs finish, reporting overall progress periodically. True if every pull succeeded."""
+        jobs = list(jobs)
+        while True:
+            pending = [job for job in jobs if not job.done.wait(0)]
+            if not pending:
+                break
+            pending[0].done.wait(report_interval)
+            if any(not job.done.is_set() for job in jobs):
+                self.report("  \033[90m[pulls]\033[0m " + " | ".join(job.describe() for job in jobs if not job.done.is_set()))
+        return all(job.ok for job in jobs)
+
+    def ensure(self, models: Iterable[str], installed: Iterable[str]) -> bool:
+        """Pull, in parallel, every model in `models` that is not in `installed`, and wait for them."""
+        have = {normalize_model_name(m) for m in installed}
+        missing = [m for m in dict.fromkeys(models) if normalize_model_name(m) not in have]
+        if not missing:
+            return True
+        self.report(f"  \033[90mPulling missing models: {', '.join(missing)}\033[0m")
+        return self.wait([self.pull(m) for m in missing])
+
+    def describe(self) -> str:
+        with self.lock:
+            jobs = list(self.jobs.values())
+        if not jobs:
+            return "No pulls started."
+        return "\n".join(f"  {job.describe()}" for job in jobs)
@@ -0,0 +1,287 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpcore
+import httpx
+import ollama
+
+DEFAULT_RACE_STATS_PATH = os.path.join("~", ".herder", "race-stats.json")
+
+_DONE = object()
+
+
+class Racer:
+    """One contestant: a model, optionally on a specific Ollama host (`model@http://host:11434`)."""
+
+    __slots__ = ("model", "host")
+
+    def __init__(self, model: str, host: Optional[str] = None):
+        self.model = model
+        self.host = host
+
+    @classmethod
+    def parse(cls, spec: str) -> "Racer":
+        model, _, host = spec.strip().partition("@")
+        return cls(model.strip(), host.strip() or None)
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.host}" if self.host else self.model
+
+
+def parse_racers(spec: str) -> List[Racer]:
+    """Parse a comma-separated `--race` list."""
+    return [Racer.parse(part) for part in spec.split(",") if part.strip()]
+
+
+class RaceStats:
+    """
+    Win counts and first-token latencies per racer, persisted as JSON so they carry over between runs.
+    They decide the order racers are started in, which matters most when hedging.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_RACE_STATS_PATH):
+        self.path = os.path.expanduser(path) if path else None
+        self.stats: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.stats = json.load(f)
+            except Exception:
+                self.stats = {}
+
+    def _entry(self, label: str) -> dict:
+        return self.stats.setdefault(label, {"races": 0, "wins": 0, "win_latency_total": 0.0})
+
+    def record(self, winner: str, latency: float, participants: List[str]):
+        with self.lock:
+            for label in participants:
+                self._entry(label)["races"] += 1
+            entry = self._entry(winner)
+            entry["wins"] += 1
+            entry["win_latency_total"] += latency
+            if self.path:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "w") as f:
+                    json.dump(self.stats, f, indent=2)
+
+    def win_rate(self, label: str) -> float:
+        entry = self.stats.get(label)
+        return entry["wins"] / entry["races"] if entry and entry["races"] else 0.0
+
+    def mean_latency(self, label: str) -> Optional[float]:
+        entry = self.stats.get(label)
+        return entry["win_latency_total"] / entry["wins"] if entry and entry["wins"] else None
+
+    def order(self, racers: List[Racer]) -> List[Racer]:
+        """Best first: highest win rate, then lowest mean winning latency; unknown racers keep their given order."""
+        def key(racer: Racer):
+            latency = self.mean_latency(racer.label)
+            return (-self.win_rate(racer.label), latency if latency is not None else float("inf"))
+        return sorted(racers, key=key)
+
+    def describe(self, racers: List[Racer]) -> str:
+        lines = []
+        for racer in self.order(racers):
+            entry = self.stats.get(racer.label, {"races": 0, "wins": 0})
+            latency = self.mean_latency(racer.label)
+            lines.append(f"  {racer.label}: {entry['wins']}/{entry['races']} wins" + (f", mean first token {latency:.2f}s" if latency is not None else ""))
+        return "\n".join(lines)
+
+
+class _AbortableBackend(httpcore.NetworkBackend):
+    """
+    Network backend that remembers its connections so another thread can abort them.
+
+    Closing a socket does not wake a thread blocked reading from it, e.g. while Ollama loads a model
+    before sending response headers; shutting it down does, and tells Ollama the client is gone.
+    """
+
+    def __init__(self, backend: httpcore.NetworkBackend):
+        self.backend = backend
+        self.streams = []
+        self.aborted = False
+        self.lock = threading.Lock()
+
+    def _track(self, stream):
+        with self.lock:
+            self.streams.append(stream)
+            aborted = self.aborted
+        if aborted:
+            self._shutdown(stream)
+        return stream
+
+    def connect_tcp(self, *args, **kwargs):
+        return self._track(self.backend.connect_tcp(*args, **kwargs))
+
+    def connect_unix_socket(self, *args, **kwargs):
+        return self._track(self.backend.connect_unix_socket(*args, **kwargs))
+
+    def sleep(self, seconds: float):
+        self.backend.sleep(seconds)
+
+    @staticmethod
+    def _shutdown(stream):
+        sock = stream.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            streams = list(self.streams)
+        for stream in streams:
+            self._shutdown(stream)
+
+
+def _abortable_transport() -> Tuple[httpx.HTTPTransport, _AbortableBackend]:
+    transport = httpx.HTTPTransport()
+    # httpx has no public hook for the network backend, so wrap the one its connection pool uses.
+    backend = _AbortableBackend(transport._pool._network_backend)
+    transport._pool._network_backend = backend
+    return transport, backend
+
+
+def _default_client(host: Optional[str] = None, **kwargs) -> ollama.Client:
+    return ollama.Client(host=host, **kwargs)
+
+
+def _has_first_token(chunk: ollama.ChatResponse) -> bool:
+    message = chunk.message
+    return bool(message.content or message.thinking or message.tool_calls or chunk.done)
+
+
+class Race:
+    """
+    Sends the same chat request to several models/hosts at once and streams the first to answer.
+
+    The winner is the first racer to produce a token (or finish). The others are cancelled at once:
+    their connections are shut down, even mid-request (e.g. while Ollama is still loading the model),
+    so Ollama stops loading or generating for them. With `hedge_delay`, racers start one after another
+    (best first, per RaceStats) and later ones only start if no token has arrived by then.
+
+    `client_factory(host, **kwargs)` builds the Ollama clients; kwargs (a `transport`) go to httpx.
+    """
+
+    def __init__(self, racers: List[Racer], stats: Optional[RaceStats] = None, hedge_delay: float = 0.0,
+                 client_factory: Optional[Callable[..., ollama.Client]] = None):
+        self.racers = racers
+        self.stats = stats or RaceStats(None)
+        self.hedge_delay = max(float(hedge_delay), 0.0)
+        self.client_factory = client_factory or _default_client
+
+    def client_for(self, racer: Racer) -> ollama.Client:
+        return self.client_factory(racer.host)
+
+    def chat(self, options_for: Optional[Callable[[str], dict]] = None, **chat_kwargs) -> Tuple[Racer, float, Iterator[ollama.ChatResponse]]:
+        """
+        Race a streaming chat request. `options_for(model)` supplies per-model runtime kwargs (options, keep_alive).
+        Returns the winning racer, its first-token latency in seconds (from its own launch), and an iterator over its chunks.
+        """
+        racers = self.stats.order(self.racers)
+        chunks: "queue.Queue" = queue.Queue()
+        decided = threading.Event()
+        cancelled = {racer.label: threading.Event() for racer in racers}
+        backends: Dict[str, _AbortableBackend] = {}
+        # Only racers that actually sent their request count as having raced; latency is measured from
+        # each racer's own launch, so a hedged racer is not charged for the head start it gave the others.
+        launched: Dict[str, float] = {}
+        lock = threading.Lock()
+
+        def run(position: int, racer: Racer):
+            # Hedging: a later racer only starts if nobody has answered by its start time.
+            if position:
+                decided.wait(position * self.hedge_delay)
+            transport, backend = _abortable_transport()
+            with lock:
+                if decided.is_set():
+                    chunks.put((racer, _DONE))
+                    return
+                launched[racer.label] = time.monotonic()
+                backends[racer.label] = backend
+            try:
+                kwargs = dict(chat_kwargs)
+                if options_for:
+                    kwargs.update(options_for(racer.model))
+                stream = self.client_factory(racer.host, transport=transport).chat(model=racer.model, stream=True, **kwargs)
+                try:
+                    for chunk in stream:
+                        if cancelled[racer.label].is_set():
+                            break
+                        chunks.put((racer, chunk))
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close:
+                        close()
+                chunks.put((racer, _DONE))
+            except Exception as e:
+                chunks.put((racer, e))
+
+        for position, racer in enumerate(racers):
+            threading.Thread(target=run, args=(position, racer), daemon=True, name=f"race-{racer.label}").start()
+
+        def cancel_all(keep: Optional[str] = None):
+            with lock:
+                decided.set()
+                aborting = [backend for label, backend in backends.items() if label != keep]
+            for label, event in cancelled.items():
+                if label != keep:
+                    event.set()
+            for backend in aborting:
+                backend.abort()
+
+        # Wait for the first racer with a real token; buffer everyone's early (empty) chunks meanwhile.
+        buffered: Dict[str, list] = {racer.label: [] for racer in racers}
+        finished = set()
+        errors = []
+        winner = None
+        try:
+            while winner is None:
+                racer, item = chunks.get()
+                if item is _DONE or isinstance(item, Exception):
+                    finished.add(racer.label)
+                    if isinstance(item, Exception):
+                        errors.append(f"{racer.label}: {item}")
+                    if len(finished) == len(racers):
+                        raise RuntimeError("All raced models failed: " + "; ".join(errors) if errors else "No raced model produced a response.")
+                    continue
+                buffered[racer.label].append(item)
+                if _has_first_token(item):
+                    winner = racer
+        except BaseException:
+            # Interrupted (e.g. Ctrl+C) or nobody answered: stop every racer.
+            cancel_all()
+            raise
+
+        latency = time.monotonic() - launched[winner.label]
+        cancel_all(keep=winner.label)
+        self.stats.record(winner.label, latency, list(launched))
+
+        def winner_stream():
+            try:
+                yield from buffered[winner.label]
+                if winner.label in finished:
+                    return
+                while True:
+                    racer, item = chunks.get()
+                    if racer.label != winner.label:
+                        continue
+                    if item is _DONE:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                # Reached on completion, on error, or when the consumer stops early (e.g. Ctrl+C).
+                cancel_all()
+
+        return winner, latency, winner_stream()
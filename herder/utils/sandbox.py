@@ -0,0 +1,307 @@
+import atexit
+import mmap
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Files at or above this size are memory-mapped instead of read into memory.
+MMAP_THRESHOLD = 1024 * 1024
+
+# Default and maximum number of bytes returned by a single read.
+DEFAULT_READ_LENGTH = 64 * 1024
+MAX_READ_LENGTH = 1024 * 1024
+
+# Default caps on listing and search results.
+DEFAULT_MAX_RESULTS = 200
+MAX_LINE_LENGTH = 400
+
+# Below this many candidate files a search runs in-process; the pool is not worth the startup.
+PARALLEL_MIN_FILES = 64
+GREP_BATCH_SIZE = 32
+
+# Directories that are never indexed or searched.
+IGNORED_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".mypy_cache", ".pytest_cache"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared search pool. Forking a process that already runs MCP and UI threads is unsafe, so prefer forkserver."""
+    global _pool
+    if _pool is None:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=ctx)
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _is_binary(buf) -> bool:
+    return b"\0" in buf[:8192]
+
+
+def _grep_file(path: str, rx: "re.Pattern", limit: int) -> List[Tuple[int, str]]:
+    """Return up to `limit` (line number, line text) matches from a single file."""
+    results = []
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return results
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD else f.read()
+    except OSError:
+        return results
+
+    try:
+        if _is_binary(buf):
+            return results
+        end_of_buf = len(buf)
+        pos = 0
+        counted = 0
+        line_no = 1
+        # A trailing newline ends the last line; it does not start an empty one zero-width patterns could match.
+        ends_with_newline = buf[end_of_buf - 1:end_of_buf] == b"\n"
+        while len(results) < limit and pos < end_of_buf:
+            m = rx.search(buf, pos)
+            if not m or (m.start() == end_of_buf and ends_with_newline):
+                break
+            start = buf.rfind(b"\n", 0, m.start()) + 1
+            end = buf.find(b"\n", m.start())
+            if end == -1:
+                end = end_of_buf
+            line_no += buf[counted:start].count(b"\n")
+            counted = start
+            line = buf[start:min(end, start + MAX_LINE_LENGTH)]
+            results.append((line_no, bytes(line).decode("utf-8", errors="replace")))
+            pos = end + 1
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    return results
+
+
+def _grep_batch(paths: List[str], pattern: bytes, flags: int, limit: int) -> List[Tuple[str, int, str]]:
+    """Search a batch of files. Runs inside the worker pool, so it only takes picklable arguments."""
+    rx = re.compile(pattern, flags)
+    results = []
+    for path in paths:
+        if len(results) >= limit:
+            break
+        for line_no, line in _grep_file(path, rx, limit - len(results)):
+            results.append((path, line_no, line))
+    return results
+
+
+class DirectoryIndex:
+    """
+    Incremental index of the files below a root directory.
+
+    Each directory's listing is cached together with its mtime, so a rescan only
+    calls scandir() on directories whose entries actually changed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+
+    def _scan(self, path: str) -> Tuple[List[str], List[str]]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._dirs.pop(path, None)
+            return [], []
+        cached = self._dirs.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        files, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in IGNORED_DIRS:
+                                subdirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return [], []
+        files.sort()
+        subdirs.sort()
+        self._dirs[path] = (mtime, files, subdirs)
+        return files, subdirs
+
+    def walk(self, start: str):
+        """Yield absolute file paths below `start` in a stable, depth-first order."""
+        stack = [start]
+        while stack:
+            path = stack.pop()
+            files, subdirs = self._scan(path)
+            for name in files:
+                yield os.path.join(path, name)
+            stack.extend(os.path.join(path, d) for d in reversed(subdirs))
+
+
+class Sandbox:
+    """
+    File access restricted to a single root directory.
+
+    All paths are resolved (including symlinks) and rejected if they escape the root; listings and
+    searches skip symlinked files that point outside it.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(os.path.expanduser(root))
+        if not os.path.isdir(self.root):
+            raise NotADirectoryError(f"Sandbox root '{root}' is not a directory.")
+        self.index = DirectoryIndex(self.root)
+
+    def contains(self, full: str) -> bool:
+        """True if the resolved absolute path `full` is the root or below it."""
+        return full == self.root or full.startswith(self.root + os.sep)
+
+    def resolve(self, path: str) -> str:
+        full = os.path.realpath(os.path.join(self.root, path or "."))
+        if not self.contains(full):
+            raise PermissionError(f"Path '{path}' is outside the sandbox root.")
+        return full
+
+    def relative(self, path: str) -> str:
+        return PurePosixPath(os.path.relpath(path, self.root)).as_posix()
+
+    def read(self, path: str, offset: int = 0, length: int = DEFAULT_READ_LENGTH) -> str:
+        full = self.resolve(path)
+        offset = max(int(offset), 0)
+        length = min(max(int(length), 0), MAX_READ_LENGTH)
+        with open(full, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset >= size:
+                return f"[{self.relative(full)}: offset {offset} is past end of file ({size} bytes)]"
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if _is_binary(mm):
+                        return f"[{self.relative(full)}: binary file, {size} bytes]"
+                    data = mm[offset:offset + length]
+            else:
+                head = f.read(8192)
+                if _is_binary(head):
+                    return f"[{self.relative(full)}: binary file, {size} bytes]"
+                f.seek(offset)
+                data = f.read(length)
+        text = data.decode("utf-8", errors="replace")
+        end = offset + len(data)
+        if end < size:
+            text += f"\n[... truncated at byte {end} of {size}; read again with offset={end} to continue]"
+        return text
+
+    def files(self, path: str = ".", pattern: str = "*") -> List[str]:
+        """Return the absolute paths below `path` matching `pattern`. Patterns without a '/' match file names."""
+        start = self.resolve(path)
+        if os.path.isfile(start):
+            return [start]
+        match_name = "/" not in pattern
+        matched = []
+        for full in self.index.walk(start):
+            rel = PurePosixPath(os.path.relpath(full, start))
+            if not (PurePosixPath(rel.name) if match_name else rel).full_match(pattern):
+                continue
+            # Directories are never followed, so only the file itself can be a link; check where it points
+            # now rather than when the directory was indexed.
+            if os.path.islink(full) and not self.contains(os.path.realpath(full)):
+                continue
+            matched.append(full)
+        return matched
+
+    def grep(self, pattern: str, path: str = ".", glob: str = "*", ignore_case: bool = False, max_results: int = DEFAULT_MAX_RESULTS) -> Tuple[List[Tuple[str, int, str]], bool]:
+        """Search file contents. Returns (matches, truncated)."""
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        pattern_bytes = pattern.encode("utf-8")
+        re.compile(pattern_bytes, flags)  # Surface bad patterns before spinning up workers.
+        candidates = self.files(path, glob)
+        limit = max(int(max_results), 1)
+
+        if len(candidates) < PARALLEL_MIN_FILES:
+            results = _grep_batch(candidates, pattern_bytes, flags, limit + 1)
+        else:
+            pool = _get_pool()
+            batches = [candidates[i:i + GREP_BATCH_SIZE] for i in range(0, len(candidates), GREP_BATCH_SIZE)]
+            futures = [pool.submit(_grep_batch, batch, pattern_bytes, flags, limit + 1) for batch in batches]
+            results = []
+            # Collect in submission order so output is stable, and stop as soon as the cap is hit.
+            for i, future in enumerate(futures):
+                results.extend(future.result())
+                if len(results) > limit:
+                    for pending in futures[i + 1:]:
+                        pending.cancel()
+                    break
+
+        truncated = len(results) > limit
+        return results[:limit], truncated
+
+
+def make_file_tools(root: str) -> List[Callable]:
+    """
+    Build the native, sandboxed file tools for the given root directory.
+    The returned callables are passed to Ollama as tools alongside the adapted MCP tools.
+    """
+    sandbox = Sandbox(root)
+
+    def read_file(path: str, offset: int = 0, length: int = DEFAULT_READ_LENGTH) -> str:
+        """
+        Read a text file inside the sandbox. Large files can be read in pieces using offset and length.
+
+        Args:
+            path: File path relative to the sandbox root.
+            offset: Byte offset to start reading from.
+            length: Maximum number of bytes to read.
+
+        Returns:
+            The file contents, with a note on how to continue if truncated.
+        """
+        return sandbox.read(path, offset, length)
+
+    def list_files(pattern: str = "*", path: str = ".", max_results: int = DEFAULT_MAX_RESULTS) -> str:
+        """
+        List files inside the sandbox matching a glob pattern.
+
+        Args:
+            pattern: Glob pattern such as '*.py' or 'src/**/*.md'. Patterns without '/' match file names.
+            path: Directory to list, relative to the sandbox root.
+            max_results: Maximum number of paths to return.
+
+        Returns:
+            Newline separated file paths relative to the sandbox root.
+        """
+        matched = sandbox.files(path, pattern)
+        limit = max(int(max_results), 1)
+        lines = [sandbox.relative(p) for p in matched[:limit]]
+        if len(matched) > limit:
+            lines.append(f"[... {len(matched) - limit} more files not shown]")
+        return "\n".join(lines) if lines else "No files matched."
+
+    def grep_files(pattern: str, path: str = ".", glob: str = "*", ignore_case: bool = False, max_results: int = DEFAULT_MAX_RESULTS) -> str:
+        """
+        Search file contents inside the sandbox with a regular expression.
+
+        Args:
+            pattern: Regular expression to search for.
+            path: Directory or file to search, relative to the sandbox root.
+            glob: Only search files matching this glob pattern, such as '*.py'.
+            ignore_case: Match case-insensitively.
+            max_results: Maximum number of matching lines to return.
+
+        Returns:
+            Matching lines formatted as 'path:line: text'.
+        """
+        results, truncated = sandbox.grep(pattern, path, glob, ignore_case, max_results)
+        lines = [f"{sandbox.relative(p)}:{n}: {text}" for p, n, text in results]
+        if truncated:
+            lines.append(f"[... results capped at {len(results)} matches]")
+        return "\n".join(lines) if lines else "No matches."
+
+    return [read_file, list_files, grep_files]
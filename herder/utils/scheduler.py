@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+# At most this many requests for one model run back to back while other models have work queued.
+DEFAULT_MAX_CONSECUTIVE = 8
+
+# A queue that has waited this long (seconds) for its turn is served next, whatever is resident.
+DEFAULT_MAX_WAIT = 600.0
+
+
+class _Request:
+    __slots__ = ("model", "fn", "args", "kwargs", "future", "enqueued")
+
+    def __init__(self, model: str, fn: Callable, args: tuple, kwargs: dict):
+        self.model = model
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class ModelAffinityScheduler:
+    """
+    Runs model requests one at a time, grouped by model, to avoid thrashing Ollama with model swaps.
+
+    Pending requests are queued per model. The scheduler keeps draining the current model's queue,
+    and when it has to switch it prefers models Ollama already has loaded (`resident_models`).
+    Fairness limits keep any queue from starving: a model gets at most `max_consecutive` requests in a
+    row while others wait, and a queue that has waited `max_wait` seconds for its turn goes next.
+    A queue's wait starts when it becomes non-empty or loses its turn, not when its requests were
+    submitted, so a long batch submitted all at once still runs in model-sized groups.
+    """
+
+    def __init__(self, resident_models: Optional[Callable[[], List[str]]] = None,
+                 max_consecutive: int = DEFAULT_MAX_CONSECUTIVE, max_wait: float = DEFAULT_MAX_WAIT):
+        self.resident_models = resident_models
+        self.max_consecutive = max(int(max_consecutive), 1)
+        self.max_wait = max_wait
+        self.queues: Dict[str, deque] = {}
+        # When each pending model other than the current one started waiting for its turn.
+        self.waiting_since: Dict[str, float] = {}
+        self.current: Optional[str] = None
+        self.consecutive = 0
+        self.switches = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, daemon=True, name="model-scheduler")
+        self.worker.start()
+
+    def submit(self, model: str, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` to run when `model` is scheduled. Returns a Future with its result."""
+        request = _Request(model, fn, args, kwargs)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Scheduler is shut down.")
+            queue = self.queues.setdefault(model, deque())
+            if not queue and model != self.current:
+                self.waiting_since[model] = request.enqueued
+            queue.append(request)
+            self.condition.notify()
+        return request.future
+
+    def _resident(self) -> List[str]:
+        if self.resident_models is None:
+            return []
+        try:
+            return self.resident_models()
+        except Exception:
+            return []
+
+    def _pick_model(self) -> str:
+        """Choose the model to serve next. Called with the condition held and at least one request pending."""
+        pending = [model for model, queue in self.queues.items() if queue]
+        waiting = [model for model in pending if model != self.current]
+        if not waiting:
+            return self.current
+        now = time.monotonic()
+        oldest = min(waiting, key=lambda m: self.waiting_since[m])
+
+        if now - self.waiting_since[oldest] >= self.max_wait:
+            return oldest
+        if self.current in pending and self.consecutive < self.max_consecutive:
+            return self.current
+
+        # Switching: prefer a model that is already loaded, then the one that has waited longest.
+        resident = set(self._resident())
+        loaded = [m for m in waiting if m in resident]
+        return min(loaded or waiting, key=lambda m: self.waiting_since[m])
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not any(self.queues.values()):
+                    self.condition.wait()
+                if not any(self.queues.values()):
+                    return
+                model = self._pick_model()
+                if model != self.current:
+                    if self.current is not None:
+                        self.switches += 1
+                        if self.queues.get(self.current):
+                            self.waiting_since[self.current] = time.monotonic()
+                    self.waiting_since.pop(model, None)
+                    self.current = model
+                    self.consecutive = 0
+                request = self.queues[model].popleft()
+                self.consecutive += 1
+
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                request.future.set_result(request.fn(*request.args, **request.kwargs))
+            except BaseException as e:
+                request.future.set_exception(e)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting requests; pending ones still run. With `wait`, block until they have."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if wait:
+            self.worker.join()
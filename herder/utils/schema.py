@@ -0,0 +1,273 @@
+import ast
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# key=value pairs separated by commas and/or whitespace; values may be quoted.
+_KEY_VALUE_RE = re.compile(r"""(\w+)\s*=\s*("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[^,\s]+)""")
+
+class ArgumentError(Exception):
+    """Arguments that cannot satisfy a tool's schema. Deliberately not a ValueError, so converters don't swallow it."""
+
+
+_TRUE_STRINGS = {"true", "yes", "1", "on"}
+_FALSE_STRINGS = {"false", "no", "0", "off"}
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def repair_arguments(text: str, param_names: List[str]) -> Dict[str, Any]:
+    """
+    Single, deterministic repair pass for argument strings the model sent instead of an object.
+
+    Tries, in order: a JSON object, a Python dict literal, key=value pairs naming only known
+    parameters, and finally positional values mapped onto `param_names` in schema order.
+    Free text that merely contains '=' (e.g. "x=5 holds") is therefore kept whole.
+    """
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            parsed = json.loads(stripped)
+        except ValueError:
+            try:
+                parsed = ast.literal_eval(stripped)
+            except (ValueError, SyntaxError):
+                parsed = None
+        if isinstance(parsed, dict):
+            return parsed
+
+    pairs = _KEY_VALUE_RE.findall(stripped)
+    if pairs and param_names and all(k in param_names for k, _ in pairs):
+        return {k: _unquote(v) for k, v in pairs}
+
+    if not param_names:
+        return {"value": text}
+    if len(param_names) > 1:
+        for values in ([v.strip() for v in stripped.split(",") if v.strip()], stripped.split()):
+            if len(values) == len(param_names):
+                return dict(zip(param_names, values))
+    return {param_names[0]: text}
+
+
+def _schema_types(schema: dict) -> List[str]:
+    """The JSON types a property accepts, most specific first. `anyOf`/`oneOf` take precedence over `type`."""
+    variants = schema.get("anyOf") or schema.get("oneOf")
+    if variants:
+        types = []
+        for variant in variants:
+            if isinstance(variant, dict):
+                types.extend(t for t in _schema_types(variant) if t not in types)
+        if types:
+            return types
+    declared = schema.get("type", "string")
+    return list(declared) if isinstance(declared, list) else [declared]
+
+
+def _object_properties(schema: dict) -> Optional[dict]:
+    """Properties of the object variant of a schema, if it describes one."""
+    if isinstance(schema.get("properties"), dict):
+        return schema["properties"]
+    for variant in schema.get("anyOf") or schema.get("oneOf") or []:
+        if isinstance(variant, dict) and isinstance(variant.get("properties"), dict):
+            return variant["properties"]
+    return None
+
+
+def _to_integer(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return float(value.strip())
+    raise ValueError
+
+
+def _to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+    raise ValueError
+
+
+def _to_string(value):
+    if value is None:
+        raise TypeError
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _to_null(value):
+    if value is None or (isinstance(value, str) and value.strip().lower() in ("", "null", "none")):
+        return None
+    raise ValueError
+
+
+def _compile_array(schema: dict) -> Callable:
+    items = schema.get("items")
+    item_converter = _compile_field(items) if isinstance(items, dict) else None
+
+    def convert(value):
+        if isinstance(value, str):
+            stripped = value.strip()
+            if stripped.startswith("["):
+                value = json.loads(stripped)
+            else:
+                value = [v.strip() for v in stripped.split(",") if v.strip()]
+        elif isinstance(value, tuple):
+            value = list(value)
+        elif not isinstance(value, list):
+            value = [value]
+        return [item_converter(v) for v in value] if item_converter else value
+    return convert
+
+
+def _compile_object(schema: dict) -> Callable:
+    properties = _object_properties(schema)
+    nested = ArgumentCoercer(properties, schema.get("required")) if properties else None
+
+    def convert(value):
+        if isinstance(value, str):
+            value = repair_arguments(value, nested.param_names if nested else [])
+        if nested is None:
+            if not isinstance(value, dict):
+                raise ValueError
+            return value
+        if not isinstance(value, dict):
+            # A bare value for an object parameter fills its primary property, e.g. request="x" -> {"term": "x"}.
+            value = {nested.primary_key: value}
+        return nested.coerce(value)
+    return convert
+
+
+_SCALAR_CONVERTERS = {
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "string": _to_string,
+    "null": _to_null,
+}
+
+
+def _compile_field(schema: dict) -> Callable:
+    """Compile a property schema into a converter. Values that cannot be converted are passed through unchanged."""
+    converters = []
+    for type_name in _schema_types(schema):
+        if type_name == "object":
+            converters.append(_compile_object(schema))
+        elif type_name == "array":
+            converters.append(_compile_array(schema))
+        elif type_name in _SCALAR_CONVERTERS:
+            converters.append(_SCALAR_CONVERTERS[type_name])
+    # Try strict conversions first so "5" becomes 5 for an integer-or-string field, but keep strings
+    # ahead of null so "" or "none" stays a string for a nullable string field.
+    converters.sort(key=lambda c: 2 if c is _to_null else 1 if c is _to_string else 0)
+
+    if len(converters) == 1:
+        only = converters[0]
+
+        def convert(value):
+            try:
+                return only(value)
+            except (ValueError, TypeError):
+                return value
+        return convert
+
+    def convert(value):
+        for converter in converters:
+            try:
+                return converter(value)
+            except (ValueError, TypeError):
+                continue
+        return value
+    return convert
+
+
+class ArgumentCoercer:
+    """
+    Precompiled argument handling for one tool's `inputs` schema.
+
+    Everything that depends only on the schema (parameter order, converters, whether loose
+    arguments must be wrapped into a single object parameter) is decided once, when the
+    tool is adapted. Each call then only does dictionary work.
+    """
+
+    def __init__(self, inputs: Optional[dict], required: Optional[List[str]] = None):
+        inputs = inputs if isinstance(inputs, dict) else {}
+        self.param_names = list(inputs.keys())
+        self.converters = {name: _compile_field(schema if isinstance(schema, dict) else {}) for name, schema in inputs.items()}
+        self.required = [name for name in (required or []) if name in inputs]
+        self.primary_key = self.required[0] if self.required else (self.param_names[0] if self.param_names else None)
+        # A tool whose only parameter is an object (e.g. `request`) gets any other arguments wrapped into it.
+        self.wrap_key = None
+        if len(self.param_names) == 1:
+            only = inputs[self.param_names[0]]
+            if isinstance(only, dict) and "object" in _schema_types(only) and _object_properties(only):
+                self.wrap_key = self.param_names[0]
+
+    def coerce(self, kwargs: dict) -> dict:
+        if not self.param_names:
+            return {}
+        if self.wrap_key and self.wrap_key not in kwargs:
+            kwargs = {self.wrap_key: kwargs}
+        elif len(kwargs) == 1 and next(iter(kwargs)) not in self.converters:
+            # A single, misnamed argument goes to the primary parameter.
+            kwargs = {self.primary_key: next(iter(kwargs.values()))}
+
+        converters = self.converters
+        coerced = {k: converters[k](v) if k in converters else v for k, v in kwargs.items()}
+        missing = [name for name in self.required if name not in coerced]
+        if missing:
+            raise ArgumentError(f"Missing required argument(s): {', '.join(missing)}. Expected: {', '.join(self.param_names)}.")
+        return coerced
+
+    def __call__(self, kwargs: dict) -> dict:
+        """Coerce the arguments Ollama handed to a tool wrapper into the tool's input dict."""
+        if len(kwargs) == 1 and "kwargs" in kwargs and "kwargs" not in self.converters:
+            # The wrapper's **kwargs signature makes models send everything as a single `kwargs` argument.
+            inner = kwargs["kwargs"]
+            if isinstance(inner, dict):
+                kwargs = inner
+            elif isinstance(inner, str):
+                kwargs = repair_arguments(inner, self.param_names)
+            elif inner is None:
+                kwargs = {}
+            elif self.param_names:
+                kwargs = {self.param_names[0]: inner}
+            else:
+                kwargs = {}
+        return self.coerce(kwargs)
+
+
+def compile_tool_inputs(inputs: Optional[dict]) -> ArgumentCoercer:
+    """
+    Compile a tool's `inputs` schema (JSON schema properties, as exposed by smolagents tools) into an ArgumentCoercer.
+    Top-level tool inputs carry no `required` list, so all of them are treated as optional.
+    """
+    return ArgumentCoercer(inputs)